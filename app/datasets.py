@@ -0,0 +1,466 @@
+from __future__ import annotations
+
+import logging
+import operator
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from .filters import compile_filter, filter_columns, filter_hash
+from .provenance import sha256_text
+from .schemas import DataDict, PlanModel
+from .settings import (
+    ALLOWED_INPUT_PREFIX,
+    ARROW_IPC,
+    DATASET_CACHE_BYTES,
+    IPC_DIR,
+    READ_WORKERS,
+)
+from .tracing import METRICS, cache_gauges
+from .types import FilterOp
+from .validator import resolve_input
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetCache:
+    """Process-wide LRU cache of loaded frames bounded by a memory budget.
+
+    Frames are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (frame, nbytes, version)
+        self._entries: (
+            "OrderedDict[Tuple[Hashable, ...], Tuple[pd.DataFrame, int, str]]"
+        ) = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(
+        self, key: Tuple[Hashable, ...], loader: Callable[[], pd.DataFrame]
+    ) -> pd.DataFrame:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        frame = loader()
+        nbytes = int(frame.memory_usage(deep=True).sum())
+        with self._lock:
+            # a new (mtime, size, dict) for a path means it changed; drop stale versions
+            for stale in [
+                k for k in self._entries if k[0] == key[0] and k[1:4] != key[1:4]
+            ]:
+                self._drop(stale)
+            if nbytes <= self.max_bytes and key not in self._entries:
+                self._entries[key] = (frame, nbytes, sha256_text(repr(key))[:16])
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    self._drop(next(iter(self._entries)))
+                    self.evictions += 1
+        return frame
+
+    def find(
+        self,
+        prefix: Tuple[Hashable, ...],
+        covers: Callable[[Tuple[Hashable, ...]], bool],
+    ) -> Optional[pd.DataFrame]:
+        """A cached frame whose key starts with ``prefix`` and whose remaining key
+        parts satisfy ``covers``; counted as a hit when found."""
+        with self._lock:
+            for key, entry in reversed(self._entries.items()):
+                if key[: len(prefix)] == prefix and covers(key[len(prefix) :]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+        return None
+
+    def holds(self, prefix: Tuple[Hashable, ...]) -> bool:
+        with self._lock:
+            return any(key[: len(prefix)] == prefix for key in self._entries)
+
+    def _drop(self, key: Tuple[Hashable, ...]) -> None:
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
+
+    def version(self, frame: pd.DataFrame) -> Optional[str]:
+        """Stable version id of a frame held by the cache, ``None`` otherwise.
+
+        Frames are matched by identity against the live entries, so a frame
+        that was evicted (or a new one at a reused address) has no version.
+        """
+        with self._lock:
+            return next(
+                (
+                    version
+                    for cached, _, version in self._entries.values()
+                    if cached is frame
+                ),
+                None,
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+CACHE = DatasetCache(DATASET_CACHE_BYTES)
+METRICS.register(
+    lambda: cache_gauges("dataset", CACHE.hits, CACHE.misses, CACHE.stats()["bytes"])
+)
+
+
+def _source(entry: Dict[str, str]) -> Path:
+    path = entry["path"]
+    return resolve_input(path) if path.startswith(ALLOWED_INPUT_PREFIX) else Path(path)
+
+
+def dataset_files(dct: DataDict) -> List[Path]:
+    """Every parquet file of the dataset: listed files, plus all ``*.parquet``
+    below listed directories (hive-partitioned or not)."""
+    files: List[Path] = []
+    for entry in dct.files:
+        source = _source(entry).resolve()
+        files.extend(sorted(source.rglob("*.parquet")) if source.is_dir() else [source])
+    return files
+
+
+def open_dataset(dct: DataDict) -> ds.Dataset:
+    """All files as one Arrow dataset; ``key=value`` directories below the common
+    root become partition columns."""
+    files = dataset_files(dct)
+    if not files:
+        raise ValueError(f"dataset {dct.dataset_id} has no parquet files")
+    base = os.path.commonpath([str(f.parent) for f in files])
+    return ds.dataset(
+        [str(f) for f in files],
+        format="parquet",
+        partitioning="hive",
+        partition_base_dir=base,
+    )
+
+
+def dataset_key(paths: Path | List[Path], dct: DataDict) -> Tuple[Hashable, ...]:
+    """``(files, mtimes, total size, dict hash)``; any file added, removed or
+    rewritten changes the key."""
+    paths = [paths] if isinstance(paths, Path) else paths
+    resolved = [p.resolve() for p in paths]
+    stats = [p.stat() for p in resolved]
+    return (
+        os.pathsep.join(map(str, resolved)),
+        tuple(st.st_mtime_ns for st in stats),
+        sum(st.st_size for st in stats),
+        sha256_text(dct.model_dump_json()),
+    )
+
+
+def read_fragments(
+    dataset: ds.Dataset, predicate: Optional[pc.Expression] = None
+) -> List[ds.Fragment]:
+    """Fragments (files) that can hold matching rows; partitions whose keys
+    contradict ``predicate`` are pruned without being opened."""
+    return list(
+        dataset.get_fragments(filter=predicate)
+        if predicate is not None
+        else dataset.get_fragments()
+    )
+
+
+def read_table(
+    dataset: ds.Dataset,
+    columns: Optional[List[str]] = None,
+    predicate: Optional[pc.Expression] = None,
+    workers: int = READ_WORKERS,
+) -> pa.Table:
+    """Read the surviving fragments on a thread pool, in file order."""
+    fragments = read_fragments(dataset, predicate)
+    if not fragments:
+        empty = dataset.schema.empty_table()
+        return empty.select(columns) if columns is not None else empty
+
+    def read(fragment: ds.Fragment) -> pa.Table:
+        return fragment.to_table(
+            schema=dataset.schema, columns=columns, filter=predicate
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(fragments)))) as pool:
+        tables = list(pool.map(read, fragments))
+    return pa.concat_tables(tables)
+
+
+def ipc_path(dct: DataDict) -> Path:
+    """Location of the IPC copy of the dataset's current version."""
+    key = dataset_key(dataset_files(dct), dct)
+    return (
+        IPC_DIR / f"{sha256_text(str(key[0]))[:16]}-{sha256_text(repr(key))[:16]}.arrow"
+    )
+
+
+def convert_to_ipc(dct: DataDict) -> Path:
+    """Write the dataset once as an uncompressed Arrow IPC file with
+    dictionary-encoded strings; older versions of the same dataset are removed."""
+    path = ipc_path(dct)
+    if path.exists():
+        return path
+    table = read_table(open_dataset(dct))
+    for i, fld in enumerate(table.schema):
+        if pa.types.is_string(fld.type) or pa.types.is_large_string(fld.type):
+            table = table.set_column(i, fld.name, table.column(i).dictionary_encode())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with (
+        pa.OSFile(str(tmp), "wb") as sink,
+        pa.ipc.new_file(sink, table.schema) as writer,
+    ):
+        writer.write_table(table)
+    os.replace(tmp, path)
+    for stale in path.parent.glob(path.name.split("-")[0] + "-*.arrow"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return path
+
+
+def load_ipc(dct: DataDict, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Memory-mapped IPC frame: numeric columns without nulls are read-only views
+    of the mapped pages, and dictionary strings become categoricals."""
+    table = pa.ipc.open_file(pa.memory_map(str(convert_to_ipc(dct)))).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return apply_dtypes(table.to_pandas(split_blocks=True), dct)
+
+
+def apply_dtypes(df: pd.DataFrame, dct: DataDict) -> pd.DataFrame:
+    """Narrow ``df`` in place to the compact dtypes the data dictionary declares.
+
+    Subgroup fields become categoricals (declared categories first, then any
+    undeclared values, which are logged), endpoint flags holding only 0/1 become bool,
+    ``int`` columns are downcast and ``float32`` columns are narrowed.
+    """
+    for col, spec in dct.columns.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        categorical = isinstance(series.dtype, pd.CategoricalDtype)
+        if spec.role == "subgroup_field":
+            if spec.categories:
+                observed = (
+                    series.cat.categories if categorical else series.dropna().unique()
+                )
+                extra = sorted(
+                    (v for v in observed if v not in spec.categories), key=str
+                )
+                if extra:
+                    logger.warning(
+                        "column %s has undeclared categories: %s",
+                        col,
+                        [str(v) for v in extra],
+                    )
+                labels = list(spec.categories) + extra
+                df[col] = (
+                    series.cat.set_categories(labels)
+                    if categorical
+                    else pd.Categorical(series, categories=labels)
+                )
+            elif not categorical:
+                df[col] = series.astype("category")
+        elif categorical:
+            continue
+        elif spec.role == "endpoint_flag" and series.dtype.kind in "iuf":
+            values = series.to_numpy()
+            if np.isin(values, (0, 1)).all():
+                df[col] = values.astype(bool)
+        elif spec.type == "int" and series.dtype.kind in "iu":
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif spec.type == "float32" and series.dtype.kind == "f":
+            df[col] = series.astype(np.float32)
+    return df
+
+
+def cohort_filters(plan: PlanModel) -> Dict[str, Dict[str, Any]]:
+    return {
+        name: filt.model_dump(by_alias=True, exclude_none=True)
+        for name, filt in plan.cohorts.items()
+    }
+
+
+def plan_columns(plan: PlanModel) -> List[str]:
+    """Columns a plan reads: cohort filters, endpoint and fairness
+    subgroups/intersections."""
+    cols = set().union(*(filter_columns(f) for f in cohort_filters(plan).values()))
+    value = plan.endpoint.value
+    cols.update(value.values() if isinstance(value, dict) else [value])
+    cols.update(plan.fairness.get("subgroups", []))
+    cols.update(
+        c for key in plan.fairness.get("intersections", []) for c in key.split("*")
+    )
+    return sorted(cols)
+
+
+def _comparable(typ: pa.DataType, val: Any) -> bool:
+    """Whether Arrow has a comparison kernel for ``typ`` against ``val``."""
+    if pa.types.is_dictionary(typ):
+        typ = typ.value_type
+    values = val if isinstance(val, list) else [val]
+    if pa.types.is_integer(typ) or pa.types.is_floating(typ):
+        return all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) for v in values
+        )
+    if pa.types.is_string(typ) or pa.types.is_large_string(typ):
+        return all(isinstance(v, str) for v in values)
+    return False
+
+
+def _pushdown(
+    filt: Dict[str, Any], schema: Optional[pa.Schema] = None
+) -> Optional[pc.Expression]:
+    """Translate a filter into an Arrow expression selecting a superset of its rows.
+
+    Only null-safe predicates are pushed; anything else becomes ``None`` (no
+    constraint), so the exact filter still has to run on the loaded frame. With
+    ``schema``, predicates whose value type does not match the column are not
+    pushed either.
+    """
+    if "and" in filt:
+        parts = [
+            e for e in (_pushdown(f, schema) for f in filt["and"]) if e is not None
+        ]
+        if not parts:
+            return None
+        expr = parts[0]
+        for part in parts[1:]:
+            expr = expr & part
+        return expr
+    if "or" in filt:
+        parts = [_pushdown(f, schema) for f in filt["or"]]
+        if not parts or any(e is None for e in parts):
+            return None
+        expr = parts[0]
+        for part in parts[1:]:
+            expr = expr | part
+        return expr
+    if "not" in filt:
+        return None
+    if schema is not None and (
+        filt["col"] not in schema.names
+        or not _comparable(schema.field(filt["col"]).type, filt["val"])
+    ):
+        return None
+    field, op, val = pc.field(filt["col"]), filt["op"], filt["val"]
+    if op == FilterOp.eq:
+        return field == val
+    if op == FilterOp.gt:
+        return field > val
+    if op == FilterOp.ge:
+        return field >= val
+    if op == FilterOp.lt:
+        return field < val
+    if op == FilterOp.le:
+        return field <= val
+    if op == FilterOp.isin:
+        return field.isin(val if isinstance(val, list) else [val])
+    if op == FilterOp.between:
+        low, high = val
+        return (field >= low) & (field <= high)
+    return None
+
+
+def plan_pushdown(
+    plan: PlanModel, schema: Optional[pa.Schema] = None
+) -> Optional[pc.Expression]:
+    """Row predicate covering the union of all cohorts of a plan."""
+    return _pushdown({"or": list(cohort_filters(plan).values())}, schema)
+
+
+def _read(
+    dct: DataDict, columns: Optional[List[str]], predicate: Optional[pc.Expression]
+) -> pd.DataFrame:
+    dataset = open_dataset(dct)
+    try:
+        table = read_table(dataset, columns, predicate)
+    except (pa.ArrowNotImplementedError, pa.ArrowTypeError, pa.ArrowInvalid):
+        # e.g. ``==`` between an int column and a string: pandas just yields False
+        table = read_table(dataset, columns)
+    return apply_dtypes(table.to_pandas(), dct)
+
+
+def load_frame(
+    dct: DataDict,
+    columns: Optional[List[str]] = None,
+    predicate: Optional[pc.Expression] = None,
+) -> pd.DataFrame:
+    """Projected (and, with ``predicate``, pushed-down) frame from :data:`CACHE`.
+
+    Any cached frame of the same dataset version holding at least ``columns``
+    and either every row or rows of the same predicate is reused. Once a frame
+    of the dataset is cached, a different predicate (another plan of the same
+    study) reads the unfiltered projection instead, which then serves them all.
+    """
+    base = dataset_key(dataset_files(dct), dct)
+    wanted = None if columns is None else tuple(sorted(set(columns)))
+    if ARROW_IPC:
+        # rows are not filtered here: any selection would copy out of the mapping
+        return CACHE.get(base + (wanted, "ipc"), lambda: load_ipc(dct, columns))
+    pred = None if predicate is None else str(predicate)
+
+    def covers(rest: Tuple[Hashable, ...]) -> bool:
+        cols, cached_pred = rest
+        return (
+            cols is None or (wanted is not None and set(wanted) <= set(cols))
+        ) and cached_pred in (None, pred)
+
+    frame = CACHE.find(base, covers)
+    if frame is not None:
+        return frame
+    if pred is not None and CACHE.holds(base):
+        predicate = pred = None
+    return CACHE.get(base + (wanted, pred), lambda: _read(dct, columns, predicate))
+
+
+def load_plan_frame(plan: PlanModel, dct: DataDict) -> pd.DataFrame:
+    return load_frame(dct, plan_columns(plan), plan_pushdown(plan))
+
+
+def load_shared_frame(plans: List[PlanModel], dct: DataDict) -> pd.DataFrame:
+    """Load one frame serving every plan of a batch and fill the mask cache for
+    their distinct cohort filters, so concurrent runs only read cached masks."""
+    columns = sorted(set().union(*(plan_columns(plan) for plan in plans)))
+    preds = [plan_pushdown(plan) for plan in plans]
+    predicate = None if any(p is None for p in preds) else reduce(operator.or_, preds)
+    df = load_frame(dct, columns, predicate)
+    version = CACHE.version(df)
+    if version is not None:
+        distinct = {
+            filter_hash(f): f for plan in plans for f in cohort_filters(plan).values()
+        }
+        for filt in distinct.values():
+            compile_filter(filt).mask(df, version=version)
+    return df
@@ -1,37 +1,45 @@
 from __future__ import annotations
 
 import json
-import random
+import os
 import time
+from itertools import combinations
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
-from lifelines import KaplanMeierFitter
 from scipy import stats
 
-from .filters import evaluate
-from .provenance import Provenance, create_manifest, sha256_file, sha256_text
+from .datasets import CACHE, cohort_filters, dataset_files, load_plan_frame
+from .fairness import subgroup_tables
+from .filters import compile_filter
+from .power import curve, n_required, power, power_chi2, power_normal
+from .provenance import Provenance, create_manifest, fingerprint_file, sha256_text
+from .resampling import resample_diff
 from .schemas import DataDict, PlanModel
-from .settings import RUNS_DIR, SMALL_CELL_DEFAULT
-
-
-def set_seed(seed: int) -> None:
-    random.seed(seed)
-    np.random.seed(seed)
+from .settings import INCREMENTAL, SMALL_CELL_DEFAULT, STREAMING_THRESHOLD_BYTES
+from .simulation import simulated_power
+from .survival import (
+    event_tables,
+    km_from_tables,
+    km_summary,
+    logrank,
+    median_times,
+    select_arms,
+    summarize,
+)
+from .tracing import current_stages, span
 
 
 def apply_cohort(df: pd.DataFrame, filt: Dict[str, Any]) -> pd.DataFrame:
-    mask = evaluate(df, filt)
+    mask = compile_filter(filt).mask(df, version=CACHE.version(df))
     return df[mask]
 
 
-def cont_stats(a: pd.Series, b: pd.Series) -> Dict[str, Any]:
-    mean_a, mean_b = a.mean(), b.mean()
-    sd_a, sd_b = a.std(ddof=1), b.std(ddof=1)
+def cont_from_moments(n1, mean_a, sd_a, n2, mean_b, sd_b) -> Dict[str, Any]:
+    """Continuous two-arm summary from per-arm moments; accepts scalars or arrays."""
     delta = mean_b - mean_a
-    n1, n2 = len(a), len(b)
     sp = np.sqrt(((n1 - 1) * sd_a**2 + (n2 - 1) * sd_b**2) / (n1 + n2 - 2))
     se = sp * np.sqrt(1 / n1 + 1 / n2)
     z = stats.norm.ppf(0.975)
@@ -46,10 +54,15 @@ def cont_stats(a: pd.Series, b: pd.Series) -> Dict[str, Any]:
     }
 
 
-def bin_stats(a: pd.Series, b: pd.Series) -> Dict[str, Any]:
-    p1, p2 = a.mean(), b.mean()
+def cont_stats(a: pd.Series, b: pd.Series) -> Dict[str, Any]:
+    return cont_from_moments(
+        len(a), a.mean(), a.std(ddof=1), len(b), b.mean(), b.std(ddof=1)
+    )
+
+
+def bin_from_moments(n1, p1, n2, p2) -> Dict[str, Any]:
+    """Binary two-arm summary from per-arm proportions; accepts scalars or arrays."""
     delta = p2 - p1
-    n1, n2 = len(a), len(b)
     z = stats.norm.ppf(0.975)
     se = np.sqrt(p1 * (1 - p1) / n1 + p2 * (1 - p2) / n2)
     ci_low = delta - z * se
@@ -62,25 +75,58 @@ def bin_stats(a: pd.Series, b: pd.Series) -> Dict[str, Any]:
     }
 
 
-def km_summary(time_a, event_a, time_b, event_b) -> Dict[str, Any]:
-    km = KaplanMeierFitter()
-    km.fit(time_a, event_a)
-    med_a = km.median_survival_time_
-    km.fit(time_b, event_b)
-    med_b = km.median_survival_time_
-    return {"median_baseline": med_a, "median_proposed": med_b}
+def bin_stats(a: pd.Series, b: pd.Series) -> Dict[str, Any]:
+    return bin_from_moments(len(a), a.mean(), len(b), b.mean())
 
 
-def power_normal(effect: float, sp: float, n: int, alpha: float) -> float:
-    se = sp * np.sqrt(2 / n)
-    z_alpha = stats.norm.ppf(1 - alpha / 2)
-    return stats.norm.cdf(abs(effect) / se - z_alpha)
+MAX_ALPHA = 0.5  # autotune never relaxes alpha to a coin flip or beyond
 
 
-def power_chi2(p1: float, p2: float, n: int, alpha: float) -> float:
-    se = np.sqrt(p1 * (1 - p1) / n + p2 * (1 - p2) / n)
-    z_alpha = stats.norm.ppf(1 - alpha / 2)
-    return stats.norm.cdf(abs(p2 - p1) / se - z_alpha)
+def autotune(
+    plan: PlanModel, kind: str, params: Dict[str, float], pwr: float, notes: List[str]
+) -> float:
+    """Raise power towards the target: declared steps in order, else the closed-form n.
+
+    Every n step grows n by at least one; an alpha step that would not rise or
+    would reach ``MAX_ALPHA`` ends that step, and both are noted.
+    """
+    pspec = plan.analysis.power
+    steps = plan.policy.autotune.steps
+    if not steps:
+        needed = n_required(kind, params, pspec.alpha, pspec.target)
+        if np.isfinite(needed) and needed > pspec.n_per_arm:
+            pspec.n_per_arm = int(needed)
+            notes.append("autotune applied: n_per_arm -> {}".format(pspec.n_per_arm))
+        return float(power(kind, params, pspec.n_per_arm, pspec.alpha))
+    for step in steps:
+        field = step.param.rsplit(".", 1)[-1]
+        if field not in ("n_per_arm", "alpha") or step.op not in ("multiply", "add"):
+            notes.append("autotune step skipped: {} {}".format(step.op, step.param))
+            continue
+        for _ in range(step.max_times):
+            if pwr >= pspec.target:
+                return pwr
+            old = getattr(pspec, field)
+            value = old * step.factor if step.op == "multiply" else old + step.factor
+            if field == "n_per_arm":
+                value = int(np.ceil(value))
+                if value <= old:
+                    notes.append(
+                        "autotune clamped: n_per_arm step gave {}, using {}".format(
+                            value, old + 1
+                        )
+                    )
+                    value = old + 1
+            elif not old < value < MAX_ALPHA:
+                notes.append(
+                    "autotune clamped: alpha step to {:g} stopped"
+                    " (must rise and stay below {:g})".format(value, MAX_ALPHA)
+                )
+                break
+            setattr(pspec, field, value)
+            notes.append("autotune applied: {} -> {}".format(field, value))
+            pwr = float(power(kind, params, pspec.n_per_arm, pspec.alpha))
+    return pwr
 
 
 def small_cell(df: pd.DataFrame, k: int) -> pd.DataFrame:
@@ -89,73 +135,436 @@ def small_cell(df: pd.DataFrame, k: int) -> pd.DataFrame:
     return df
 
 
-def fairness(df_a: pd.DataFrame, df_b: pd.DataFrame, subs: List[str], k: int):
-    out: Dict[str, Any] = {}
-    for col in subs:
-        tbl_a = df_a[col].value_counts(normalize=False).rename("baseline")
-        tbl_b = df_b[col].value_counts(normalize=False).rename("proposed")
-        comp = pd.concat([tbl_a, tbl_b], axis=1).fillna(0).astype(int)
-        comp["delta"] = comp["proposed"] - comp["baseline"]
-        comp = comp.reset_index().rename(columns={"index": col})
-        comp["pct"] = comp["proposed"] / len(df_b) * 100
-        comp["n"] = comp["proposed"]
-        comp = small_cell(comp, k).drop(columns=["n"])
-        out[col] = comp.to_dict(orient="records")
+def fairness(
+    df_a: pd.DataFrame,
+    df_b: pd.DataFrame,
+    subs: List[str],
+    k: int,
+    categories: Dict[str, List[str]] | None = None,
+    intersections: List[str] | None = None,
+):
+    cols = list(
+        dict.fromkeys(subs + [c for key in intersections or [] for c in key.split("*")])
+    )
+    both = pd.concat([df_a[cols], df_b[cols]], ignore_index=True)
+    masks = np.zeros((2, len(both)), dtype=bool)
+    masks[0, : len(df_a)] = True
+    masks[1, len(df_a) :] = True
+    return subgroup_tables(both, masks, subs, k, categories, intersections or [])
+
+
+def endpoint_power(
+    plan: PlanModel, res: Dict[str, Any], event_rate: float = np.nan
+) -> Tuple[str, Dict[str, float]]:
+    """Power model and its parameters: plan assumptions first, observed values
+    otherwise."""
+    pspec = plan.analysis.power
+    kind = plan.endpoint.type.value
+    if kind == "continuous":
+        return kind, {"effect": pspec.effect_assumed or res["delta"], "sp": res["sp"]}
+    if kind == "binary":
+        return kind, {
+            "p1": pspec.p1_assumed or res["p1"],
+            "p2": pspec.p2_assumed or res["p2"],
+        }
+    return kind, {"hr": pspec.assumed_hr or res["hr"], "event_rate": event_rate}
+
+
+def power_results(
+    plan: PlanModel,
+    kind: str,
+    params: Dict[str, float],
+    notes: List[str],
+    sample: Tuple[np.ndarray, np.ndarray] | None = None,
+) -> Dict[str, Any]:
+    """Analytic power, autotune, n required and curve; with ``method: simulation``
+    the reported power is simulated at the final n (``sample`` as in
+    :func:`app.simulation.simulated_power`) and the analytic value is kept
+    alongside."""
+    pspec = plan.analysis.power
+    with span("power"):
+        pwr = float(power(kind, params, pspec.n_per_arm, pspec.alpha))
+        if pwr < pspec.target and plan.policy.autotune.enable:
+            pwr = autotune(plan, kind, params, pwr, notes)
+        needed = n_required(kind, params, pspec.alpha, pspec.target)
+        out = {
+            "power": pwr,
+            "n_required": int(needed) if np.isfinite(needed) else None,
+            "power_curve": curve(
+                kind, params, pspec.n_per_arm, pspec.alpha, pspec.target
+            ),
+        }
+    if pspec.method == "simulation":
+        with span("simulate"):
+            sim = simulated_power(
+                kind,
+                params,
+                pspec.n_per_arm,
+                pspec.alpha,
+                plan.seed,
+                sample,
+                pspec.mc_se,
+            )
+        out["power_analytic"] = pwr
+        out["power"] = float(sim.pop("power"))
+        out["power_simulation"] = sim
+        notes.append(
+            "power simulated from the {} model: {} trials, MC SE {:.4f}".format(
+                sim["model"], sim["trials"], sim["mc_se"]
+            )
+        )
+        if sim["capped"]:
+            notes.append(
+                "simulation trials capped by SIM_MAX_ROWS at n_per_arm {}".format(
+                    pspec.n_per_arm
+                )
+            )
     return out
 
-def execute(plan: PlanModel, dct: DataDict, run_dir: Path) -> Tuple[Dict[str, Any], List[str]]:
-    df = pd.read_parquet(dct.files[0]["path"])
-    notes: List[str] = []
-    set_seed(plan.seed)
-    cohorts = {name: apply_cohort(df, filt.model_dump(by_alias=True, exclude_none=True)) for name, filt in plan.cohorts.items()}
-    baseline, proposed = cohorts["baseline"], cohorts["proposed"]
-    endpoint = plan.endpoint
-    results: Dict[str, Any] = {"n_baseline": len(baseline), "n_proposed": len(proposed)}
 
+def observed_arms(
+    plan: PlanModel, df: pd.DataFrame, masks: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray] | None:
+    """Baseline and proposed outcomes for simulation from the observed cohorts;
+    None when the plan asks for the parametric model (or an assumed HR, which
+    resampled survival times cannot carry) or an arm has no usable rows."""
+    pspec = plan.analysis.power
+    endpoint = plan.endpoint
+    if (
+        pspec.method != "simulation"
+        or pspec.simulate_from != "observed"
+        or endpoint.type == "binary"
+    ):
+        return None
     if endpoint.type == "continuous":
-        res = cont_stats(baseline[endpoint.value], proposed[endpoint.value])
-        results["stats"] = res
-        effect = plan.analysis.power.effect_assumed or res["delta"]
-        pwr = power_normal(effect, res["sp"], plan.analysis.power.n_per_arm, plan.analysis.power.alpha)
-    elif endpoint.type == "binary":
-        res = bin_stats(baseline[endpoint.value], proposed[endpoint.value])
-        results["stats"] = res
-        p1 = plan.analysis.power.p1_assumed or res["p1"]
-        p2 = plan.analysis.power.p2_assumed or res["p2"]
-        pwr = power_chi2(p1, p2, plan.analysis.power.n_per_arm, plan.analysis.power.alpha)
+        y = df[endpoint.value].to_numpy(float, na_value=np.nan)
+        arms = tuple(y[mask][~np.isnan(y[mask])] for mask in masks[:2])
+    elif pspec.assumed_hr:
+        return None
     else:
         val = endpoint.value
-        res = km_summary(
-            baseline[val["time"]], baseline[val["event"]], proposed[val["time"]], proposed[val["event"]]
+        both = np.stack(
+            [
+                df[val["time"]].to_numpy(float, na_value=np.nan),
+                df[val["event"]].to_numpy(float, na_value=np.nan),
+            ]
         )
-        results["stats"] = res
-        pwr = 0.0  # placeholder
-    results["power"] = pwr
-
-    if pwr < plan.analysis.power.target and plan.policy.autotune.enable:
-        new_n = int(plan.analysis.power.n_per_arm * 1.15)
-        plan.analysis.power.n_per_arm = new_n
-        notes.append("autotune applied: n_per_arm -> {}".format(new_n))
+        arms = tuple(both[:, mask][:, ~np.isnan(both[0, mask])] for mask in masks[:2])
+    return arms if all(arm.shape[-1] for arm in arms) else None
+
+
+def event_rate(tables: Dict[str, np.ndarray]) -> float:
+    observed = tables["observed"].sum()
+    return tables["deaths"].sum() / observed if observed else np.nan
+
+
+def subgroup_categories(dct: DataDict) -> Dict[str, List[str]]:
+    return {
+        col: spec.categories for col, spec in dct.columns.items() if spec.categories
+    }
+
+
+def cohort_order(plan: PlanModel) -> List[str]:
+    """Cohort names with ``baseline`` first, then ``proposed`` if present, then the
+    rest in plan order; the first two are the pair reported at the top level."""
+    names = list(plan.cohorts)
+    if "baseline" not in names or len(names) < 2:
+        raise ValueError("plan needs a 'baseline' cohort and at least one other")
+    first = ["baseline"] + (["proposed"] if "proposed" in names else [])
+    return first + [name for name in names if name not in first]
+
+
+def cohort_moments(
+    masks: np.ndarray, y: np.ndarray, block: int = 1 << 16
+) -> Tuple[np.ndarray, ...]:
+    """Rows, non-null count, mean and sum of squared deviations of ``y`` for every
+    row of the ``(K, N)`` mask matrix.
+
+    Each block of rows is one ``(K, block) @ (block, 4)`` product, so all cohorts
+    cost a single pass over ``y`` and the temporaries stay at ``K * block``.
+    """
+    y = np.asarray(y, dtype=float)
+    valid = ~np.isnan(y)
+    # shift by the mean so sums of squares do not lose precision
+    shift = y[valid].mean() if valid.any() else 0.0
+    sums = np.zeros((len(masks), 4))
+    for start in range(0, len(y), block):
+        part = y[start : start + block] - shift
+        ok = valid[start : start + block]
+        centred = np.where(ok, part, 0.0)
+        cols = np.stack([np.ones(len(part)), ok, centred, centred**2], axis=1)
+        sums += masks[:, start : start + block] @ cols
+    rows, count, total, squares = sums.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count + shift
+        m2 = np.where(count > 0, squares - total**2 / count, 0.0)
+    return rows.astype(np.int64), count.astype(np.int64), mean, np.maximum(m2, 0.0)
+
+
+def holm(p: np.ndarray) -> np.ndarray:
+    """Holm step-down adjusted p-values; NaNs are left out of the family."""
+    p = np.asarray(p, dtype=float)
+    out = np.full(len(p), np.nan)
+    finite = np.flatnonzero(~np.isnan(p))
+    order = finite[np.argsort(p[finite], kind="stable")]
+    steps = (len(order) - np.arange(len(order))) * p[order]
+    out[order] = np.minimum(1.0, np.maximum.accumulate(steps))
+    return out
+
+
+def comparisons(
+    plan: PlanModel,
+    names: List[str],
+    rows: np.ndarray,
+    mean: np.ndarray | None = None,
+    sd: np.ndarray | None = None,
+    tables: Dict[str, np.ndarray] | None = None,
+) -> Dict[str, Any]:
+    """Every contrast against the first cohort (or every pair, with
+    ``analysis.comparisons: pairwise``) from per-cohort summaries.
+
+    Statistics and power are evaluated for all contrasts at once on arrays; the
+    p-values are Holm-adjusted over the family and ``power_adjusted`` is the power
+    at the Bonferroni level ``alpha / m`` that Holm's first step requires.
+    """
+    pspec = plan.analysis.power
+    kind = plan.endpoint.type.value
+    pairs = (
+        list(combinations(range(len(names)), 2))
+        if plan.analysis.comparisons == "pairwise"
+        else [(0, j) for j in range(1, len(names))]
+    )
+    a, b = (np.array(side, dtype=np.int64) for side in zip(*pairs))
+    cohorts: Dict[str, Dict[str, Any]] = {
+        name: {"n": int(rows[i])} for i, name in enumerate(names)
+    }
+    if kind == "time_to_event":
+        tests = [logrank(tables, i, j) for i, j in pairs]
+        res = {key: np.array([t[key] for t in tests]) for key in ("hr", "logrank_p")}
+        p = res["logrank_p"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = np.array(
+                [
+                    tables["deaths"][[i, j]].sum() / tables["observed"][[i, j]].sum()
+                    for i, j in pairs
+                ]
+            )
+        medians = median_times(tables["times"], km_from_tables(tables)["survival"])
+        for i, name in enumerate(names):
+            cohorts[name]["median"] = float(medians[i])
+        records = [dict(t) for t in tests]
+    else:
+        if kind == "continuous":
+            res = cont_from_moments(rows[a], mean[a], sd[a], rows[b], mean[b], sd[b])
+            keys = ("delta", "sp")
+        else:
+            res = bin_from_moments(rows[a], mean[a], rows[b], mean[b])
+            keys = ("delta",)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            se = (res["ci"][1] - res["ci"][0]) / (2 * stats.norm.ppf(0.975))
+            p = 2 * stats.norm.sf(np.abs(res["delta"]) / se)
+        rate = np.nan
+        for i, name in enumerate(names):
+            cohorts[name]["mean"] = float(mean[i])
+            if sd is not None:
+                cohorts[name]["sd"] = float(sd[i])
+        records = [
+            {
+                **{key: float(res[key][c]) for key in keys},
+                "ci": [float(res["ci"][0][c]), float(res["ci"][1][c])],
+            }
+            for c in range(len(pairs))
+        ]
+    kind, params = endpoint_power(plan, res, rate)
+    shape = (len(pairs),)
+    pwr = np.broadcast_to(power(kind, params, pspec.n_per_arm, pspec.alpha), shape)
+    pwr_adj = np.broadcast_to(
+        power(kind, params, pspec.n_per_arm, pspec.alpha / len(pairs)), shape
+    )
+    adjusted = holm(p)
+    contrasts = [
+        {
+            "reference": names[i],
+            "cohort": names[j],
+            "stats": records[c],
+            "p_value": float(p[c]),
+            "p_holm": float(adjusted[c]),
+            "significant": bool(adjusted[c] < pspec.alpha),
+            "power": float(pwr[c]),
+            "power_adjusted": float(pwr_adj[c]),
+        }
+        for c, (i, j) in enumerate(pairs)
+    ]
+    return {
+        "mode": plan.analysis.comparisons,
+        "adjustment": "holm",
+        "cohorts": cohorts,
+        "contrasts": contrasts,
+    }
+
+
+def analyze(
+    plan: PlanModel, dct: DataDict, df: pd.DataFrame
+) -> Tuple[Dict[str, Any], List[str]]:
+    """In-memory analysis of a loaded frame.
+
+    All cohorts are stacked into one ``(K, N)`` mask matrix and summarized
+    together; the top-level fields describe baseline vs proposed as before and
+    ``comparisons`` holds every contrast.
+    """
+    notes: List[str] = []
+    version = CACHE.version(df)
+    names = cohort_order(plan)
+    filters = cohort_filters(plan)
+    with span("filter"):
+        masks = np.stack(
+            [compile_filter(filters[name]).mask(df, version=version) for name in names]
+        )
+    endpoint = plan.endpoint
+
+    rate = np.nan
+    with span("stats"):
+        if endpoint.type != "time_to_event":
+            # only the endpoint column is gathered; the frame itself is never copied
+            y = df[endpoint.value].to_numpy(float, na_value=np.nan)
+            rows, count, mean, m2 = cohort_moments(masks, y)
+            with np.errstate(invalid="ignore"):
+                sd = np.where(count > 1, np.sqrt(m2 / (count - 1)), np.nan)
         if endpoint.type == "continuous":
-            pwr = power_normal(effect, res["sp"], new_n, plan.analysis.power.alpha)
+            res = cont_from_moments(rows[0], mean[0], sd[0], rows[1], mean[1], sd[1])
         elif endpoint.type == "binary":
-            pwr = power_chi2(p1, p2, new_n, plan.analysis.power.alpha)
-        results["power"] = pwr
+            res = bin_from_moments(rows[0], mean[0], rows[1], mean[1])
+        else:
+            val = endpoint.value
+            tables = event_tables(
+                df[val["time"]].to_numpy(float), df[val["event"]].to_numpy(float), masks
+            )
+            rows = masks.sum(axis=1)
+            pair = select_arms(tables, (0, 1))
+            res = summarize(pair)
+            rate = event_rate(pair)
+    results: Dict[str, Any] = {
+        "n_baseline": int(rows[0]),
+        "n_proposed": int(rows[1]),
+        "stats": res,
+    }
+    wanted = set(plan.analysis.stats) & {"bootstrap", "permutation"}
+    if wanted and endpoint.type != "time_to_event":
+        with span("resample"):
+            res.update(
+                resample_diff(
+                    y[masks[0]],
+                    y[masks[1]],
+                    plan.seed,
+                    bootstrap="bootstrap" in wanted,
+                    permutation="permutation" in wanted,
+                )
+            )
+    elif wanted:
+        notes.append("resampling skipped: not available for time_to_event")
 
-    subs = plan.fairness.get("subgroups", [])
-    results["fairness"] = fairness(
-        baseline, proposed, subs, plan.privacy.get("small_cell_k", SMALL_CELL_DEFAULT)
+    # contrasts use the plan's own n and alpha, so they run before autotune changes them
+    with span("comparisons"):
+        if endpoint.type == "time_to_event":
+            family = comparisons(plan, names, rows, tables=tables)
+        else:
+            family = comparisons(plan, names, rows, mean, sd)
+    kind, params = endpoint_power(plan, res, rate)
+    results.update(
+        power_results(plan, kind, params, notes, observed_arms(plan, df, masks))
     )
-    run_dir.mkdir(parents=True, exist_ok=True)
-    res_path = run_dir / "results.json"
-    res_path.write_text(json.dumps(results, indent=2))
+    results["comparisons"] = family
+
+    with span("fairness"):
+        results["fairness"] = subgroup_tables(
+            df,
+            masks[:2],
+            plan.fairness.get("subgroups", []),
+            plan.privacy.get("small_cell_k", SMALL_CELL_DEFAULT),
+            subgroup_categories(dct),
+            plan.fairness.get("intersections", []),
+        )
+    return results, notes
+
+
+def use_streaming(dct: DataDict) -> bool:
+    return (
+        sum(path.stat().st_size for path in dataset_files(dct))
+        > STREAMING_THRESHOLD_BYTES
+    )
+
+
+def execute(
+    plan: PlanModel,
+    dct: DataDict,
+    run_dir: Path,
+    df: pd.DataFrame | None = None,
+    streaming: bool | None = None,
+) -> Tuple[Dict[str, Any], List[str]]:
+    resampling = set(plan.analysis.stats) & {"bootstrap", "permutation"}
+    if df is None and INCREMENTAL and not resampling:
+        from .incremental import analyze_incremental  # builds on this module
+
+        results, notes = analyze_incremental(plan, dct)
+    elif df is None and (use_streaming(dct) if streaming is None else streaming):
+        from .streaming import analyze_streaming  # streaming builds on this module
+
+        results, notes = analyze_streaming(plan, dct)
+    else:
+        if df is None:
+            with span("load"):
+                df = load_plan_frame(plan, dct)
+        results, notes = analyze(plan, dct, df)
+    with span("write_results"):
+        run_dir.mkdir(parents=True, exist_ok=True)
+        res_path = run_dir / "results.json"
+        res_path.write_text(json.dumps(results, indent=2))
     return results, notes
 
 
-def finalize(plan: PlanModel, dct_path: Path, run_dir: Path, results: Dict[str, Any], seed: int) -> Provenance:
+def dataset_fingerprint(dct: DataDict) -> str:
+    """Fingerprint of a single file, or a digest over every file's fingerprint and
+    its path relative to the files' common directory, so a copied or moved
+    dataset keeps its fingerprint."""
+    files = dataset_files(dct)
+    if len(files) == 1:
+        return fingerprint_file(files[0])
+    root = os.path.commonpath([str(path.parent) for path in files])
+    return sha256_text(
+        json.dumps(
+            [
+                [path.relative_to(root).as_posix(), fingerprint_file(path)]
+                for path in files
+            ]
+        )
+    )
+
+
+def finalize(
+    plan: PlanModel,
+    dct: DataDict,
+    run_dir: Path,
+    results: Dict[str, Any],
+    seed: int,
+    start_time: float | None = None,
+    stages: Dict[str, float] | None = None,
+) -> Provenance:
+    """Write manifest.json; ``stages`` are the durations traced for this run so far."""
     plan_hash = sha256_text(plan.model_dump_json())
-    dataset_hash = sha256_file(dct_path.parent / dct_path.name.replace("data_dict.yaml", "data.parquet"))
+    with span("fingerprint"):
+        dataset_hash = dataset_fingerprint(dct)
     end = time.time()
-    prov = Provenance(plan_hash, dataset_hash, seed, 0.0, end)
-    create_manifest(run_dir, prov)
+    parent = (results.get("incremental") or {}).get("parent_version")
+    prov = Provenance(
+        plan_hash,
+        dataset_hash,
+        seed,
+        end if start_time is None else start_time,
+        end,
+        parent,
+    )
+    with span("manifest"):
+        create_manifest(
+            run_dir, prov, stages if stages is not None else current_stages()
+        )
     return prov
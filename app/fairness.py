@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def _py(value: Any) -> Any:
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def encode(
+    series: pd.Series, declared: Optional[Sequence[Any]] = None
+) -> Tuple[np.ndarray, List[Any]]:
+    """Categorical codes for a subgroup column; missing values get -1.
+
+    Declared categories come first, in order, followed by any other observed values.
+    """
+    labels = list(declared or [])
+    observed = (
+        series.cat.categories
+        if isinstance(series.dtype, pd.CategoricalDtype)
+        else series.dropna().unique()
+    )
+    known = set(labels)
+    labels += sorted((_py(v) for v in observed if v not in known), key=str)
+    codes = pd.Categorical(series, categories=labels).codes.astype(np.int64)
+    return codes, labels
+
+
+def _combine(
+    parts: List[Tuple[np.ndarray, List[Any]]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Dense codes of the combinations of several encoded columns that occur
+    (-1 if any part is missing), and per code the label index of each part.
+
+    Codes are compressed with ``np.unique`` after every column, so they stay
+    below the row count however many columns are combined; cells are in
+    lexicographic order of their label indices.
+    """
+    codes = np.zeros(len(parts[0][0]), dtype=np.int64)
+    missing = np.zeros(len(codes), dtype=bool)
+    cells = np.zeros((1, 0), dtype=np.int64)
+    for part, labels in parts:
+        missing |= part < 0
+        flat = codes * len(labels) + np.maximum(part, 0)
+        flat[missing] = -1
+        uniq, codes = np.unique(flat, return_inverse=True)
+        valid = uniq >= 0
+        prev, idx = np.divmod(uniq[valid], len(labels))
+        cells = np.column_stack([cells[prev], idx])
+        codes = codes.reshape(-1) - int((~valid).sum())
+    return codes, cells
+
+
+def cell_counts(codes: np.ndarray, masks: np.ndarray, n_cells: int) -> np.ndarray:
+    """Counts per (cohort, cell) from a single bincount over combined codes."""
+    cohort, rows = np.nonzero(masks)
+    cell = codes[rows]
+    keep = cell >= 0
+    flat = cohort[keep] * n_cells + cell[keep]
+    return np.bincount(flat, minlength=len(masks) * n_cells).reshape(
+        len(masks), n_cells
+    )
+
+
+def comparison_records(
+    cols: List[str],
+    labels: List[List[Any]],
+    cells: np.ndarray,
+    base: np.ndarray,
+    prop: np.ndarray,
+    n_proposed: int,
+    k: int,
+) -> List[Dict[str, Any]]:
+    """Baseline vs proposed records for every observed cell, small cells suppressed.
+
+    ``cells[i]`` holds the label index per column of cell ``i``.
+    """
+    present = np.flatnonzero((base > 0) | (prop > 0))
+    pct = (
+        prop[present] / n_proposed * 100
+        if n_proposed
+        else np.full(len(present), np.nan)
+    )
+    suppressed = prop[present] < k
+    records = []
+    for j, cell in enumerate(present):
+        rec: Dict[str, Any] = {
+            col: labels[c][cells[cell, c]] for c, col in enumerate(cols)
+        }
+        rec["baseline"] = int(base[cell])
+        rec["proposed"] = int(prop[cell])
+        rec["delta"] = int(prop[cell] - base[cell])
+        rec["pct"] = None if suppressed[j] else float(pct[j])
+        records.append(rec)
+    return records
+
+
+def subgroup_tables(
+    df: pd.DataFrame,
+    masks: np.ndarray,
+    subgroups: List[str],
+    k: int,
+    categories: Optional[Dict[str, Sequence[Any]]] = None,
+    intersections: Sequence[str] = (),
+) -> Dict[str, Any]:
+    """Marginal and intersectional (``"a*b"``) subgroup tables for the baseline
+    (``masks[0]``) and proposed (``masks[1]``) cohorts of ``df``."""
+    categories = categories or {}
+    needed = list(
+        dict.fromkeys(
+            list(subgroups) + [c for key in intersections for c in key.split("*")]
+        )
+    )
+    encoded = {col: encode(df[col], categories.get(col)) for col in needed}
+    n_proposed = int(masks[1].sum())
+    out: Dict[str, Any] = {}
+    for key in list(subgroups) + list(intersections):
+        cols = key.split("*")
+        codes, cells = _combine([encoded[c] for c in cols])
+        counts = cell_counts(codes, masks[:2], len(cells))
+        out[key] = comparison_records(
+            cols,
+            [encoded[c][1] for c in cols],
+            cells,
+            counts[0],
+            counts[1],
+            n_proposed,
+            k,
+        )
+    return out
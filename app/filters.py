@@ -1,45 +1,286 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import operator
-from typing import Any, Dict, Iterable
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
+import numpy as np
 import pandas as pd
 
+from .settings import MASK_CACHE_BYTES
+from .tracing import METRICS, cache_gauges
 from .types import FilterOp
 
+_COMPARE = {
+    FilterOp.eq: operator.eq,
+    FilterOp.ne: operator.ne,
+    FilterOp.gt: operator.gt,
+    FilterOp.ge: operator.ge,
+    FilterOp.lt: operator.lt,
+    FilterOp.le: operator.le,
+}
 
-def _apply_predicate(df: pd.DataFrame, pred: Dict[str, Any]) -> pd.Series:
+
+class MaskCache:
+    """LRU cache of filter masks keyed by (dataset version, node hash), stored as
+    bitsets."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, int]]" = (
+            OrderedDict()
+        )
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str], n: int) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != n:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return np.unpackbits(entry[0], count=n).view(bool)
+
+    def put(self, key: Tuple[str, str], mask: np.ndarray) -> None:
+        bits = np.packbits(mask)
+        with self._lock:
+            if key in self._entries or bits.nbytes > self.max_bytes:
+                return
+            self._entries[key] = (bits, len(mask))
+            self._bytes += bits.nbytes
+            while self._bytes > self.max_bytes:
+                _, (old, _) = self._entries.popitem(last=False)
+                self._bytes -= old.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+MASKS = MaskCache(MASK_CACHE_BYTES)
+METRICS.register(
+    lambda: cache_gauges("mask", MASKS.hits, MASKS.misses, MASKS.stats()["bytes"])
+)
+
+
+def _canonical_value(op: FilterOp, val: Any) -> Any:
+    if op in (FilterOp.isin, FilterOp.notin):
+        values = val if isinstance(val, list) else [val]
+        return sorted(set(values), key=lambda v: (type(v).__name__, v))
+    return val
+
+
+def canonical(filt: Dict[str, Any]) -> Dict[str, Any]:
+    """Normal form of a filter: children sorted and deduplicated, ``in`` lists
+    sorted."""
+    for key in ("and", "or"):
+        if key in filt:
+            children = sorted({_dumps(canonical(f)) for f in filt[key]})
+            if len(children) == 1:
+                return json.loads(children[0])
+            return {key: [json.loads(c) for c in children]}
+    if "not" in filt:
+        return {"not": canonical(filt["not"])}
+    op = FilterOp(filt["op"])
+    return {
+        "col": filt["col"],
+        "op": op.value,
+        "val": _canonical_value(op, filt.get("val")),
+    }
+
+
+def _dumps(filt: Dict[str, Any]) -> str:
+    return json.dumps(filt, sort_keys=True, default=str)
+
+
+def filter_hash(filt: Dict[str, Any]) -> str:
+    return hashlib.sha256(_dumps(canonical(filt)).encode("utf-8")).hexdigest()
+
+
+class _Run:
+    __slots__ = ("scratch", "version")
+
+    def __init__(self, scratch: List[np.ndarray], version: Optional[str]) -> None:
+        self.scratch = scratch
+        self.version = version
+
+
+# A compiled node writes its mask into ``out``, using ``run.scratch[level]`` for its
+# children.
+Node = Callable[[pd.DataFrame, np.ndarray, _Run], None]
+
+
+def _memoize(node: Node, filt: Dict[str, Any]) -> Node:
+    digest = hashlib.sha256(_dumps(filt).encode("utf-8")).hexdigest()
+
+    def cached(df: pd.DataFrame, out: np.ndarray, run: _Run) -> None:
+        if run.version is None:
+            node(df, out, run)
+            return
+        key = (run.version, digest)
+        hit = MASKS.get(key, len(out))
+        if hit is not None:
+            out[...] = hit
+            return
+        node(df, out, run)
+        MASKS.put(key, out)
+
+    return cached
+
+
+def _as_mask(result: Any) -> np.ndarray:
+    if isinstance(result, pd.Series):
+        return result.to_numpy(dtype=bool, na_value=False)
+    return np.asarray(result, dtype=bool)
+
+
+def _compile_predicate(pred: Dict[str, Any]) -> Node:
     col = pred["col"]
-    op = pred["op"]
+    op = FilterOp(pred["op"])
     val = pred["val"]
-    series = df[col]
-    ops = {
-        FilterOp.eq: operator.eq,
-        FilterOp.ne: operator.ne,
-        FilterOp.gt: operator.gt,
-        FilterOp.ge: operator.ge,
-        FilterOp.lt: operator.lt,
-        FilterOp.le: operator.le,
-    }
-    if op in ops:
-        return ops[FilterOp(op)](series, val)
-    if op == FilterOp.isin:
-        return series.isin(val if isinstance(val, Iterable) else [val])
-    if op == FilterOp.notin:
-        return ~series.isin(val if isinstance(val, Iterable) else [val])
-    if op == FilterOp.between:
+    if op in _COMPARE:
+        fn = _COMPARE[op]
+
+        def compute(series: pd.Series) -> np.ndarray:
+            if series.dtype.kind in "iufb":
+                return fn(series.to_numpy(), val)
+            return _as_mask(fn(series, val))
+
+    elif op in (FilterOp.isin, FilterOp.notin):
+        values = (
+            list(val)
+            if isinstance(val, Iterable) and not isinstance(val, str)
+            else [val]
+        )
+        negate = op == FilterOp.notin
+
+        def compute(series: pd.Series) -> np.ndarray:
+            mask = _as_mask(series.isin(values))
+            return np.logical_not(mask, out=mask) if negate else mask
+
+    elif op == FilterOp.between:
+        if not isinstance(val, list) or len(val) != 2:
+            raise ValueError(f"between requires [low, high] for {col}")
         low, high = val
-        return series.between(low, high)
-    raise ValueError(f"unknown op {op}")
+
+        def compute(series: pd.Series) -> np.ndarray:
+            if series.dtype.kind in "iuf":
+                arr = series.to_numpy()
+                mask = arr >= low
+                return np.logical_and(mask, arr <= high, out=mask)
+            return _as_mask(series.between(low, high))
+
+    else:  # pragma: no cover - FilterOp() rejects unknown ops
+        raise ValueError(f"unknown op {op}")
+
+    def node(df: pd.DataFrame, out: np.ndarray, run: _Run) -> None:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # evaluate once per category (plus missing, last) and gather by code
+            probe = pd.Series(list(series.cat.categories) + [None], dtype=object)
+            out[...] = compute(probe)[series.cat.codes.to_numpy()]
+        else:
+            out[...] = compute(series)
+
+    return _memoize(node, pred)
+
+
+def _compile(filt: Dict[str, Any], level: int) -> tuple[Node, int]:
+    """Compile a canonical ``filt`` into a node; also returns the scratch depth it
+    needs."""
+    for key, combine, identity in (
+        ("and", np.logical_and, True),
+        ("or", np.logical_or, False),
+    ):
+        if key not in filt:
+            continue
+        compiled = [_compile(f, level + 1) for f in filt[key]]
+        children = [c for c, _ in compiled]
+        depth = max([level + 1] + [d for _, d in compiled])
+        # and stops once nothing is left, or once everything is in
+        done = (lambda m: not m.any()) if identity else (lambda m: m.all())
+
+        def node(df, out, run):
+            out.fill(identity)
+            tmp = run.scratch[level]
+            for child in children:
+                child(df, tmp, run)
+                combine(out, tmp, out=out)
+                if done(out):
+                    break
+
+        return _memoize(node, filt), depth
+    if "not" in filt:
+        child, depth = _compile(filt["not"], level)
+
+        def node(df, out, run):
+            child(df, out, run)
+            np.logical_not(out, out=out)
+
+        return node, depth
+    return _compile_predicate(filt), level
+
+
+class CompiledFilter:
+    """A filter tree compiled once into nested NumPy mask kernels.
+
+    Passing a dataset ``version`` to :meth:`mask` reuses and records the mask of
+    every subtree in :data:`MASKS`, so identical predicates are computed once.
+    """
+
+    def __init__(
+        self, filt: Dict[str, Any], columns: Optional[Iterable[str]] = None
+    ) -> None:
+        self.columns = frozenset(filter_columns(filt))
+        if columns is not None:
+            unknown = self.columns - set(columns)
+            if unknown:
+                raise ValueError(f"unknown column {sorted(unknown)[0]}")
+        self._root, self._depth = _compile(canonical(filt), 0)
+
+    def mask(self, df: pd.DataFrame, version: Optional[str] = None) -> np.ndarray:
+        n = len(df)
+        out = np.empty(n, dtype=bool)
+        scratch = [np.empty(n, dtype=bool) for _ in range(self._depth)]
+        self._root(df, out, _Run(scratch, version))
+        return out
+
+
+@lru_cache(maxsize=256)
+def _compiled(key: str) -> CompiledFilter:
+    return CompiledFilter(json.loads(key))
+
+
+def compile_filter(filt: Dict[str, Any]) -> CompiledFilter:
+    return _compiled(_dumps(canonical(filt)))
 
 
 def evaluate(df: pd.DataFrame, filt: Dict[str, Any]) -> pd.Series:
-    if "and" in filt:
-        masks = [evaluate(df, f) for f in filt["and"]]
-        return pd.concat(masks, axis=1).all(axis=1)
-    if "or" in filt:
-        masks = [evaluate(df, f) for f in filt["or"]]
-        return pd.concat(masks, axis=1).any(axis=1)
+    return pd.Series(compile_filter(filt).mask(df), index=df.index)
+
+
+def filter_columns(filt: Dict[str, Any]) -> Set[str]:
+    for key in ("and", "or"):
+        if key in filt:
+            return set().union(*(filter_columns(f) for f in filt[key]))
     if "not" in filt:
-        return ~evaluate(df, filt["not"])
-    return _apply_predicate(df, filt)
+        return filter_columns(filt["not"])
+    return {filt["col"]}
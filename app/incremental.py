@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pyarrow.dataset as ds
+
+from .datasets import (
+    cohort_filters,
+    dataset_files,
+    dataset_key,
+    open_dataset,
+    plan_pushdown,
+    read_fragments,
+)
+from .filters import canonical
+from .provenance import sha256_text
+from .schemas import DataDict, PlanModel
+from .settings import READ_WORKERS, STATE_DIR, STATE_TTL_SECONDS, STREAM_BATCH_ROWS
+from .streaming import StreamState, finish, iter_batches, update
+from .tracing import span
+
+
+def state_key(plan: PlanModel, dct: DataDict) -> str:
+    """Everything the sufficient statistics depend on: the dataset (its id and
+    resolved root), cohorts, endpoint, subgroups and the dictionary's columns,
+    but not the individual files or power settings."""
+    files = dataset_files(dct)
+    spec = {
+        "dataset": dct.dataset_id,
+        "root": (
+            os.path.commonpath([str(path.parent) for path in files]) if files else None
+        ),
+        "cohorts": {
+            name: canonical(filt) for name, filt in cohort_filters(plan).items()
+        },
+        "endpoint": plan.endpoint.model_dump(mode="json"),
+        "fairness": plan.fairness,
+        "columns": {col: spec.model_dump() for col, spec in dct.columns.items()},
+    }
+    return sha256_text(json.dumps(spec, sort_keys=True, default=str))[:32]
+
+
+def dataset_version(dct: DataDict) -> str:
+    return sha256_text(repr(dataset_key(dataset_files(dct), dct)))[:16]
+
+
+def _ident(path: Path) -> List[int]:
+    st = path.stat()
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def row_group_digest(fragment: ds.ParquetFileFragment, row_group: int) -> str:
+    """Content hash of one row group's column chunks (and its partition values),
+    so a row group keeps its identity when a file is rewritten with more appended."""
+    group = fragment.metadata.row_group(row_group)
+    hasher = hashlib.sha256(str(fragment.partition_expression).encode())
+    with open(fragment.path, "rb") as fh:
+        for j in range(group.num_columns):
+            chunk = group.column(j)
+            start = (
+                chunk.dictionary_page_offset
+                if chunk.has_dictionary_page
+                else chunk.data_page_offset
+            )
+            fh.seek(start)
+            remaining = chunk.total_compressed_size
+            while remaining > 0:
+                data = fh.read(min(remaining, 1 << 20))
+                if not data:
+                    break
+                hasher.update(data)
+                remaining -= len(data)
+    return hasher.hexdigest()[:32]
+
+
+def _piece(fragment: ds.ParquetFileFragment, predicate, digest: str) -> ds.Fragment:
+    for piece in fragment.split_by_row_group(predicate):
+        if row_group_digest(fragment, piece.row_groups[0].id) == digest:
+            return piece
+    raise FileNotFoundError(f"row group {digest} is no longer in {fragment.path}")
+
+
+def collect_states(store: Path, live: set, ttl: float = STATE_TTL_SECONDS) -> None:
+    """Delete row-group states not used for ``ttl`` seconds; reused states are
+    touched, so a state another run of the same store still reads stays."""
+    cutoff = time.time() - ttl
+    for path in store.glob("*.json"):
+        try:
+            if path.name not in live and path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            continue
+
+
+def _write_json(path: Path, data: Any) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+
+def analyze_incremental(
+    plan: PlanModel, dct: DataDict, batch_rows: int = STREAM_BATCH_ROWS
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Streaming analysis over per-row-group states persisted under STATE_DIR.
+
+    Unchanged files reuse their row-group list without being opened beyond the
+    footer; changed or new files are hashed per row group and only row groups
+    never seen before are scanned. A state deleted under a concurrent run is
+    rebuilt from its row group. ``results["incremental"]`` records the reuse and
+    the parent dataset version.
+    """
+    store = STATE_DIR / state_key(plan, dct)
+    store.mkdir(parents=True, exist_ok=True)
+    index_path = store / "index.json"
+    try:
+        index = json.loads(index_path.read_text())
+    except (OSError, ValueError):
+        index = {"version": None, "files": {}}
+
+    dataset = open_dataset(dct)
+    predicate = plan_pushdown(plan, dataset.schema)
+    units: List[Tuple[str, ds.Fragment | None, ds.Fragment]] = []
+    files: Dict[str, Any] = {}
+    with span("incremental_index"):
+        for fragment in read_fragments(dataset, predicate):
+            path = str(Path(fragment.path).resolve())
+            ident = _ident(Path(path))
+            known = index["files"].get(path)
+            if (
+                known
+                and known["ident"] == ident
+                and all((store / f"{d}.json").exists() for d in known["units"])
+            ):
+                units.extend((digest, None, fragment) for digest in known["units"])
+                files[path] = known
+                continue
+            digests = []
+            for piece in fragment.split_by_row_group(predicate):
+                digest = row_group_digest(fragment, piece.row_groups[0].id)
+                digests.append(digest)
+                units.append(
+                    (
+                        digest,
+                        None if (store / f"{digest}.json").exists() else piece,
+                        fragment,
+                    )
+                )
+            files[path] = {"ident": ident, "units": digests}
+
+    rebuilt: List[str] = []
+
+    def load(unit: Tuple[str, ds.Fragment | None, ds.Fragment]) -> StreamState:
+        digest, piece, fragment = unit
+        if piece is None:
+            path = store / f"{digest}.json"
+            try:
+                os.utime(path)
+                return StreamState.from_json(json.loads(path.read_text()))
+            except FileNotFoundError:
+                piece = _piece(fragment, predicate, digest)
+                rebuilt.append(digest)
+        part = StreamState()
+        for chunk in iter_batches(plan, dct, dataset, piece, batch_rows):
+            update(part, plan, dct, chunk)
+        _write_json(store / f"{digest}.json", part.to_json())
+        return part
+
+    state = StreamState()
+    with (
+        span("scan"),
+        ThreadPoolExecutor(
+            max_workers=max(1, min(READ_WORKERS, len(units) or 1))
+        ) as pool,
+    ):
+        for part in pool.map(load, units):
+            state.merge(part)
+
+    version = dataset_version(dct)
+    parent = index["version"] if index["version"] != version else index.get("parent")
+    scanned = sum(piece is not None for _, piece, _ in units) + len(rebuilt)
+    _write_json(index_path, {"version": version, "parent": parent, "files": files})
+    collect_states(store, {f"{digest}.json" for digest, _, _ in units} | {"index.json"})
+
+    notes = [
+        "incremental execution: scanned {} of {} row groups".format(scanned, len(units))
+    ]
+    results = finish(plan, dct, state, notes)
+    results["incremental"] = {
+        "state_key": store.name,
+        "row_groups": len(units),
+        "scanned": scanned,
+        "reused": len(units) - scanned,
+        "dataset_version": version,
+        "parent_version": parent,
+    }
+    return results, notes
@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from .settings import JOBS_DB, JOBS_LEASE_SECONDS, JOBS_MAX_PENDING, JOBS_WORKERS
+from .tracing import METRICS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    body TEXT NOT NULL,
+    idempotency_key TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    stages TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    owner TEXT
+)
+"""
+
+
+class QueueFull(Exception):
+    """Raised when the number of queued and running jobs reaches the limit."""
+
+
+class JobStore:
+    """Job state persisted in SQLite so it survives restarts."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            if "owner" not in {
+                row["name"] for row in conn.execute("PRAGMA table_info(jobs)")
+            }:
+                conn.execute(
+                    "ALTER TABLE jobs ADD COLUMN owner TEXT"
+                )  # databases from before job claiming
+            self._ready = True
+        return conn
+
+    def create(
+        self, job_id: str, body: Dict[str, Any], idempotency_key: Optional[str]
+    ) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, state, body, idempotency_key, created, updated)"
+                " VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(body), idempotency_key, now, now),
+            )
+
+    def update(self, job_id: str, state: str, **fields: Any) -> None:
+        cols = {"state": state, "updated": time.time()}
+        cols.update(
+            {
+                k: v if isinstance(v, str) or v is None else json.dumps(v)
+                for k, v in fields.items()
+            }
+        )
+        assign = ", ".join(f"{k} = ?" for k in cols)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {assign} WHERE id = ?", (*cols.values(), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["body"] = json.loads(job["body"])
+        job["stages"] = json.loads(job["stages"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """Atomically move a queued job to running under ``owner``; False if
+        another worker got it first or it is no longer queued."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET state = 'running', owner = ?, updated = ?"
+                " WHERE id = ? AND state = 'queued'",
+                (owner, time.time(), job_id),
+            )
+        return cur.rowcount == 1
+
+    def renew(self, job_id: str, owner: str) -> bool:
+        """Extend the lease of a job ``owner`` is still running."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET updated = ?"
+                " WHERE id = ? AND owner = ? AND state = 'running'",
+                (time.time(), job_id, owner),
+            )
+        return cur.rowcount == 1
+
+    def requeue_abandoned(self, lease: float) -> int:
+        """Requeue running jobs whose owner is gone: on this host, a process that
+        no longer exists; on another host, one whose lease of ``lease`` seconds
+        since the last update or heartbeat has expired."""
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, owner, updated FROM jobs WHERE state = 'running'"
+            ).fetchall()
+            stale = [
+                row["id"]
+                for row in rows
+                if not _owner_alive(row["owner"])
+                or (not _owner_local(row["owner"]) and row["updated"] < now - lease)
+            ]
+            for job_id in stale:
+                conn.execute(
+                    "UPDATE jobs SET state = 'queued', owner = NULL, updated = ?"
+                    " WHERE id = ? AND state = 'running'",
+                    (now, job_id),
+                )
+        return len(stale)
+
+    def queued(self) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE state = 'queued' ORDER BY created"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+
+def _owner_local(owner: Optional[str]) -> bool:
+    return bool(owner) and owner.split(":", 1)[0] == socket.gethostname()
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """Whether the process named by an ``host:pid:nonce`` owner may still run;
+    owners on other hosts are assumed alive until their lease expires."""
+    if not owner:
+        return False
+    host, pid, _ = owner.split(":", 2)
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def run_job(job_id: str, owner: str) -> None:
+    """Claim and execute one job inside a pool worker, recording state and stage
+    timings; a job claimed by another worker is skipped. While it runs, a
+    heartbeat renews the lease every third of ``JOBS_LEASE_SECONDS``."""
+    from .main import _parse_plan, _run_plan  # main imports this module
+    from .validator import load_datadict, resolve_input
+
+    store = JobStore(JOBS_DB)
+    if not store.claim(job_id, owner):
+        return
+    stop = threading.Event()
+
+    def heartbeat() -> None:
+        while not stop.wait(JOBS_LEASE_SECONDS / 3) and store.renew(job_id, owner):
+            pass
+
+    threading.Thread(target=heartbeat, name=f"lease-{job_id}", daemon=True).start()
+    try:
+        job = store.get(job_id)
+        stages: Dict[str, float] = {"queued": time.time() - job["created"]}
+        store.update(job_id, "running", stages=stages)
+        try:
+            plan, plan_text = _parse_plan(job["body"])
+            dct_path = resolve_input(plan.dataset.dict)
+            result = _run_plan(
+                plan,
+                plan_text,
+                job["idempotency_key"],
+                dct_path,
+                load_datadict(dct_path),
+                stages=stages,
+            )
+        except Exception as exc:
+            store.update(
+                job_id, "failed", stages=stages, error=str(getattr(exc, "detail", exc))
+            )
+            return
+        store.update(job_id, "done", stages=stages, result=result)
+    finally:
+        stop.set()
+
+
+class JobQueue:
+    """Bounded process pool in front of :class:`JobStore`.
+
+    Several processes may share one store: workers claim rows atomically, so a
+    job dispatched by more than one of them still runs once.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        workers: int,
+        max_pending: int,
+        lease: float = JOBS_LEASE_SECONDS,
+    ) -> None:
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Set[Future] = set()
+        self._lock = threading.RLock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                ctx = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=ctx
+                )
+            return self._pool
+
+    def _reset(self, pool: ProcessPoolExecutor) -> None:
+        """Drop a broken pool so the next dispatch starts a fresh one."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def recover(self) -> int:
+        """Requeue abandoned jobs and dispatch everything queued; called at startup."""
+        self.store.requeue_abandoned(self.lease)
+        queued = self.store.queued()
+        for job_id in queued:
+            self._dispatch(job_id)
+        return len(queued)
+
+    def _dispatch(self, job_id: str) -> None:
+        pool = self._executor()
+        try:
+            fut = pool.submit(run_job, job_id, self.owner)
+        except BrokenProcessPool:
+            self._reset(pool)
+            pool = self._executor()
+            fut = pool.submit(run_job, job_id, self.owner)
+        with self._lock:
+            self._pending.add(fut)
+
+        def done(f: Future) -> None:
+            with self._lock:
+                self._pending.discard(f)
+            exc = None if f.cancelled() else f.exception()
+            if exc is None and not f.cancelled():
+                return
+            if isinstance(exc, BrokenProcessPool):
+                self._reset(pool)
+            job = self.store.get(job_id)
+            if job is not None and job["state"] == "queued":
+                self._dispatch(job_id)  # never started: run it on the replacement pool
+            elif exc is not None:
+                self.store.update(
+                    job_id, "failed", error=str(exc) or type(exc).__name__
+                )
+
+        fut.add_done_callback(done)
+
+    def submit(
+        self, body: Dict[str, Any], idempotency_key: Optional[str] = None
+    ) -> str:
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull(f"{len(self._pending)} jobs pending")
+            job_id = uuid.uuid4().hex
+            self.store.create(job_id, body, idempotency_key)
+            self._dispatch(job_id)
+        return job_id
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+
+QUEUE = JobQueue(JobStore(JOBS_DB), JOBS_WORKERS, JOBS_MAX_PENDING)
+METRICS.register(lambda: {"agentic_queue_depth": {(): QUEUE.depth()}})
@@ -10,13 +10,17 @@ class JsonFormatter(logging.Formatter):
 
     def format(self, record: logging.LogRecord) -> str:  # pragma: no cover - simple
         payload: Dict[str, Any] = {
+            "time": record.created,
             "level": record.levelname,
             "name": record.name,
             "message": record.getMessage(),
         }
         if record.args:
             payload["args"] = record.args
-        return json.dumps(payload)
+        for key in ("run_id", "stages"):
+            if hasattr(record, key):
+                payload[key] = getattr(record, key)
+        return json.dumps(payload, default=str)
 
 
 def configure() -> None:
@@ -1,25 +1,88 @@
 from __future__ import annotations
 
 import json
+import logging
+import shutil
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Tuple
 
-import uvicorn
 import yaml
-from fastapi import FastAPI, Header, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from .executor import execute, finalize
+from .jobs import QUEUE, QueueFull
 from .logging_utils import configure as log_config
 from .planner import from_question
-from .provenance import cache_get_or_set
-from .reporter import render_card
-from .schemas import PlanModel
-from .settings import RUNS_DIR
-from .validator import load_datadict, load_plan, load_plan_str, resolve_input
+from .provenance import cache_get_or_set, environment_snapshot
+from .reporter import RENDERS, _template, artifact_status, render_card
+from .schemas import DataDict, PlanModel, SweepSpec
+from .settings import ARROW_IPC, BATCH_WORKERS, PREWARM, PREWARM_DATASETS, RUNS_DIR
+from .tracing import METRICS, span, trace
+from .validator import (
+    load_datadict,
+    load_plan,
+    load_plan_str,
+    resolve_input,
+    resolve_output,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas, pyarrow, scipy and jinja2 are imported on first use by the handlers
+# that need them (or by prewarm()), keeping worker cold start to FastAPI itself.
 
 log_config()
-app = FastAPI(title="Agentic MVP")
+logger = logging.getLogger(__name__)
+WARM = threading.Event()
+
+
+def prewarm() -> None:
+    """Import the analysis stack, snapshot the environment, compile templates and
+    fingerprint the registered datasets. With ARROW_IPC they are converted;
+    otherwise those small enough for in-memory runs are loaded whole into the
+    dataset cache, where the frame covers every plan's projection and pushdown."""
+    from . import executor, streaming, sweep  # noqa: F401
+    from .datasets import convert_to_ipc, load_frame
+
+    with span("prewarm"):
+        environment_snapshot()
+        _template()
+        for uri in PREWARM_DATASETS:
+            dct = load_datadict(resolve_input(uri))
+            executor.dataset_fingerprint(dct)
+            if ARROW_IPC:
+                convert_to_ipc(dct)
+            elif not executor.use_streaming(dct):
+                load_frame(dct)
+
+
+def _prewarm_then_ready() -> None:
+    try:
+        prewarm()
+    except Exception:  # a failed prewarm only costs latency: handlers load lazily
+        logger.exception("prewarm failed")
+    WARM.set()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    QUEUE.recover()  # resume jobs queued or abandoned before a restart
+    if PREWARM:
+        threading.Thread(
+            target=_prewarm_then_ready, name="prewarm", daemon=True
+        ).start()
+    yield
+
+
+if not PREWARM:
+    WARM.set()
+app = FastAPI(title="Agentic MVP", lifespan=lifespan)
 
 
 @app.post("/plan")
@@ -29,46 +92,168 @@ def plan(body: Dict[str, Any]):
     return from_question(question, defaults)
 
 
-@app.post("/run")
-def run(body: Dict[str, Any], idempotency_key: str | None = Header(default=None)):
+def _parse_plan(body: Dict[str, Any]) -> Tuple[PlanModel, str]:
     plan_yaml = body.get("plan_yaml")
     plan_json = body.get("plan_json")
     if plan_yaml:
-        plan = load_plan_str(plan_yaml)
-        plan_text = plan_yaml
-    elif plan_json:
-        plan = load_plan(plan_json)
-        plan_text = yaml.safe_dump(plan_json)
-    else:
-        raise HTTPException(400, "plan required")
+        return load_plan_str(plan_yaml), plan_yaml
+    if plan_json:
+        return load_plan(plan_json), yaml.safe_dump(plan_json)
+    raise HTTPException(400, "plan required")
 
-    dct_path = resolve_input(plan.dataset.dict)
-    dct = load_datadict(dct_path)
-    key = json.dumps([plan.model_dump_json(), dct_path.stat().st_mtime, idempotency_key])
-    run_id = cache_get_or_set(key)
-    run_dir = RUNS_DIR / (run_id or uuid.uuid4().hex)
-    if run_id:
-        res_path = run_dir / "results.json"
-        if not res_path.exists():
-            raise HTTPException(500, "cached run missing")
-        results = json.loads(res_path.read_text())
-        notes = ["cached"]
-    else:
-        results, notes = execute(plan, dct, run_dir)
-        cache_get_or_set(key, run_dir.name)
-    finalize(plan, dct_path, run_dir, results, plan.seed)
-    card = render_card(plan_text, results, run_dir)
+
+def _run_plan(
+    plan: PlanModel,
+    plan_text: str,
+    idempotency_key: str | None,
+    dct_path: Path,
+    dct: DataDict,
+    df: pd.DataFrame | None = None,
+    stages: Dict[str, float] | None = None,
+) -> Dict[str, Any]:
+    from .datasets import dataset_files, dataset_key
+    from .executor import execute, finalize
+
+    start = time.time()
+    stages = {} if stages is None else stages
+    with trace(stages), span("run"):
+        files = dataset_key(dataset_files(dct), dct)
+        # the dictionary counts by content (files[3]), so rewriting it unchanged
+        # keeps cached runs
+        key = json.dumps(
+            [plan.model_dump_json(), files[0], files[1], files[3], idempotency_key]
+        )
+        run_id = cache_get_or_set(key)
+        run_dir = RUNS_DIR / (run_id or uuid.uuid4().hex)
+        with span("execute"):
+            if run_id:
+                res_path = run_dir / "results.json"
+                if not res_path.exists():
+                    raise HTTPException(500, "cached run missing")
+                results = json.loads(res_path.read_text())
+                notes = ["cached"]
+            else:
+                results, notes = execute(plan, dct, run_dir, df=df)
+                cache_get_or_set(key, run_dir.name)
+        with span("finalize"):
+            finalize(plan, dct, run_dir, results, plan.seed, start_time=start)
+        with span("render_submit"):
+            artifacts = RENDERS.submit(plan_text, results, run_dir)
+    logger.info("run complete", extra={"run_id": run_dir.name, "stages": stages})
     return {
         "run_id": run_dir.name,
         "final_plan_yaml": plan_text,
         "results_json_path": str(run_dir / "results.json"),
-        "card_md": card["card_md"],
-        "card_pdf": card["card_pdf"],
+        "card_md": str(run_dir / "evidence_card.md"),
+        "card_pdf": (
+            str(run_dir / "evidence_card.pdf") if shutil.which("pandoc") else ""
+        ),
+        "artifacts": artifacts["state"],
         "manifest": str(run_dir / "manifest.json"),
         "notes": notes,
     }
 
 
+@app.post("/run")
+def run(body: Dict[str, Any], idempotency_key: str | None = Header(default=None)):
+    plan, plan_text = _parse_plan(body)
+    dct_path = resolve_input(plan.dataset.dict)
+    return _run_plan(
+        plan, plan_text, idempotency_key, dct_path, load_datadict(dct_path)
+    )
+
+
+def _run_batch(items: List[Dict[str, Any]]) -> Iterator[str]:
+    from .datasets import load_shared_frame
+
+    parsed: Dict[str, List[Tuple[int, PlanModel, str, str | None]]] = {}
+    for i, item in enumerate(items):
+        try:
+            plan, plan_text = _parse_plan(item)
+        except (HTTPException, ValueError, yaml.YAMLError) as exc:
+            yield json.dumps(
+                {"index": i, "error": str(getattr(exc, "detail", exc))}
+            ) + "\n"
+            continue
+        parsed.setdefault(plan.dataset.dict, []).append(
+            (i, plan, plan_text, item.get("idempotency_key"))
+        )
+
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        futures = {}
+        for uri, group in parsed.items():
+            try:
+                dct_path = resolve_input(uri)
+                dct = load_datadict(dct_path)
+                df = load_shared_frame([plan for _, plan, _, _ in group], dct)
+            except (
+                Exception
+            ) as exc:  # one bad dataset fails its own plans, not the stream
+                for i, _, _, _ in group:
+                    yield json.dumps(
+                        {"index": i, "error": str(getattr(exc, "detail", exc))}
+                    ) + "\n"
+                continue
+            for i, plan, plan_text, key in group:
+                futures[
+                    pool.submit(_run_plan, plan, plan_text, key, dct_path, dct, df)
+                ] = i
+        for fut in as_completed(futures):
+            try:
+                line = {"index": futures[fut], **fut.result()}
+            except Exception as exc:
+                line = {
+                    "index": futures[fut],
+                    "error": str(getattr(exc, "detail", exc)),
+                }
+            yield json.dumps(line) + "\n"
+
+
+@app.post("/run/batch")
+def run_batch(body: Dict[str, Any]):
+    """Run many plans; results stream back as NDJSON in completion order."""
+    items = body.get("plans")
+    if not isinstance(items, list):
+        raise HTTPException(400, "plans required")
+    return StreamingResponse(_run_batch(items), media_type="application/x-ndjson")
+
+
+@app.post("/jobs", status_code=202)
+def submit_job(
+    body: Dict[str, Any], idempotency_key: str | None = Header(default=None)
+):
+    _parse_plan(body)  # reject invalid plans before queueing
+    try:
+        job_id = QUEUE.submit(body, idempotency_key)
+    except QueueFull as exc:
+        raise HTTPException(429, str(exc), headers={"Retry-After": "5"})
+    return {"job_id": job_id, "state": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = QUEUE.store.get(job_id)
+    if job is None:
+        raise HTTPException(404, "unknown job")
+    job.pop("body")
+    return job
+
+
+@app.post("/sweep")
+def sweep(body: Dict[str, Any]):
+    plan, _ = _parse_plan(body)
+    if "sweep" not in body:
+        raise HTTPException(400, "sweep required")
+    from .sweep import sweep as run_sweep
+
+    spec = SweepSpec.model_validate(body["sweep"])
+    dct = load_datadict(resolve_input(plan.dataset.dict))
+    try:
+        return run_sweep(plan, dct, spec)
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+
+
 @app.post("/render")
 def render(body: Dict[str, Any]):
     plan_yaml = body["plan_yaml"]
@@ -78,15 +263,33 @@ def render(body: Dict[str, Any]):
     return render_card(plan_yaml, results, run_dir)
 
 
+@app.get("/runs/{run_id}/artifacts")
+def artifacts(run_id: str):
+    status = artifact_status(resolve_output(f"local://runs/{run_id}"))
+    if status is None:
+        raise HTTPException(404, "unknown run")
+    return status
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return METRICS.render()
+
+
 @app.get("/healthz")
 def healthz():
     return {"status": "ok"}
 
 
 @app.get("/readyz")
-def readyz():
+def readyz(response: Response):
+    if not WARM.is_set():
+        response.status_code = 503
+        return {"status": "warming"}
     return {"status": "ready"}
 
 
 if __name__ == "__main__":  # pragma: no cover
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8080)
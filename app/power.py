@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+from scipy import stats
+
+# ``params`` per endpoint type; ``effect`` grids vary the first key.
+PARAMS = {
+    "continuous": ("effect", "sp"),
+    "binary": ("p2", "p1"),
+    "time_to_event": ("hr", "event_rate"),
+}
+
+
+def _z(alpha):
+    return stats.norm.ppf(1 - np.asarray(alpha, dtype=float) / 2)
+
+
+def power_normal(effect, sp, n, alpha):
+    se = sp * np.sqrt(2 / np.asarray(n, dtype=float))
+    return stats.norm.cdf(np.abs(effect) / se - _z(alpha))
+
+
+def power_chi2(p1, p2, n, alpha):
+    n = np.asarray(n, dtype=float)
+    se = np.sqrt(p1 * (1 - p1) / n + p2 * (1 - p2) / n)
+    return stats.norm.cdf(np.abs(p2 - p1) / se - _z(alpha))
+
+
+def power_logrank(hr, event_rate, n, alpha):
+    """Schoenfeld approximation for 1:1 allocation with ``2 n event_rate`` events."""
+    events = 2 * np.asarray(n, dtype=float) * event_rate
+    return stats.norm.cdf(np.sqrt(events / 4) * np.abs(np.log(hr)) - _z(alpha))
+
+
+def power(kind: str, params: Dict[str, float], n, alpha):
+    if kind == "continuous":
+        return power_normal(params["effect"], params["sp"], n, alpha)
+    if kind == "binary":
+        return power_chi2(params["p1"], params["p2"], n, alpha)
+    return power_logrank(params["hr"], params["event_rate"], n, alpha)
+
+
+def n_required(kind: str, params: Dict[str, float], alpha, target):
+    """Smallest n per arm reaching ``target`` power (closed form inverse of
+    :func:`power`)."""
+    z = _z(alpha) + stats.norm.ppf(target)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if kind == "continuous":
+            n = 2 * (z * params["sp"] / params["effect"]) ** 2
+        elif kind == "binary":
+            p1, p2 = params["p1"], params["p2"]
+            n = z**2 * (p1 * (1 - p1) + p2 * (1 - p2)) / (p2 - p1) ** 2
+        else:
+            events = 4 * z**2 / np.log(params["hr"]) ** 2
+            n = events / (2 * params["event_rate"])
+    return np.ceil(n)
+
+
+def power_curves(
+    kind: str,
+    params: Dict[str, float],
+    n,
+    alpha,
+    effect: Optional[Any] = None,
+) -> np.ndarray:
+    """Power on the full grid; the result has shape
+    ``(len(alpha), len(effect), len(n))``."""
+    key = PARAMS[kind][0]
+    effect = np.atleast_1d(params[key] if effect is None else effect).astype(float)
+    alpha = np.atleast_1d(alpha).astype(float)[:, None, None]
+    n = np.atleast_1d(n).astype(float)[None, None, :]
+    grid = {**params, key: effect[None, :, None]}
+    return np.broadcast_to(
+        power(kind, grid, n, alpha), (alpha.shape[0], effect.shape[0], n.shape[2])
+    )
+
+
+def curve(
+    kind: str, params: Dict[str, float], n_per_arm: int, alpha: float, target: float
+) -> Dict[str, Any]:
+    """Power over n at the plan's alpha and effect, spanning the required n."""
+    needed = n_required(kind, params, alpha, target)
+    top = max(n_per_arm, needed if np.isfinite(needed) else n_per_arm) * 2
+    grid = np.unique(np.linspace(2, max(top, 4), 25).round().astype(int))
+    return {
+        "n": grid.tolist(),
+        "power": power_curves(kind, params, grid, alpha)[0, 0].tolist(),
+    }
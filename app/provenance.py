@@ -1,15 +1,36 @@
 from __future__ import annotations
 
 import hashlib
+import importlib.metadata
 import json
+import mmap
+import os
 import platform
-import subprocess
+import sqlite3
 import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
-from .settings import CACHE_FILE, RUNS_DIR
+from .settings import (
+    CACHE_DB,
+    CACHE_FILE,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL_SECONDS,
+    ENV_DIR,
+    FINGERPRINT_BLOCK_BYTES,
+)
+from .tracing import METRICS, cache_gauges
+
+# Files of at most one block hash to their plain SHA-256; larger files to a
+# Merkle root H(0x01 || H(0x00 || block_0) || ...), recorded in manifests.
+FINGERPRINT_SCHEME = "sha256-merkle-v2"
+_LEAF, _NODE = b"\x00", b"\x01"
 
 
 @dataclass
@@ -19,56 +40,282 @@ class Provenance:
     seed: int
     start_time: float
     end_time: float
+    parent_version: Optional[str] = None
 
 
 def sha256_file(path: Path) -> str:
     hasher = hashlib.sha256()
     with path.open("rb") as fh:
-        for chunk in iter(lambda: fh.read(8192), b""):
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
             hasher.update(chunk)
     return hasher.hexdigest()
 
 
+def _leaf(data: memoryview) -> bytes:
+    hasher = hashlib.sha256(_LEAF)
+    hasher.update(data)
+    return hasher.digest()
+
+
+def _merkle_sha256(path: Path, block: int) -> str:
+    """SHA-256 over fixed-size blocks hashed in parallel, combined into one root.
+
+    A file of a single block hashes to its plain SHA-256; leaf and root hashes
+    are domain-separated by a prefix byte, so a root cannot equal a leaf.
+    """
+    size = path.stat().st_size
+    if size <= block:
+        return sha256_file(path)
+    with (
+        path.open("rb") as fh,
+        mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+    ):
+        view = memoryview(mm)
+        try:
+            with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+                leaves = list(
+                    pool.map(
+                        lambda off: _leaf(view[off : off + block]),
+                        range(0, size, block),
+                    )
+                )
+        finally:
+            view.release()
+    return hashlib.sha256(_NODE + b"".join(leaves)).hexdigest()
+
+
+_FINGERPRINTS: Dict[Tuple[Any, ...], str] = {}
+
+
+def fingerprint_file(path: Path) -> str:
+    """Dataset fingerprint memoized per (path, inode, size, mtime_ns).
+
+    The digest is kept in memory and in a ``<file>.fingerprint.json`` sidecar, so
+    a dataset version is hashed once rather than on every run.
+    """
+    path = path.resolve()
+    st = path.stat()
+    ident = [str(path), st.st_ino, st.st_size, st.st_mtime_ns]
+    key = tuple(ident)
+    if key in _FINGERPRINTS:
+        return _FINGERPRINTS[key]
+    sidecar = path.with_name(path.name + ".fingerprint.json")
+    try:
+        stored = json.loads(sidecar.read_text())
+    except (OSError, ValueError):
+        stored = {}
+    if (
+        stored.get("ident") == ident
+        and stored.get("block") == FINGERPRINT_BLOCK_BYTES
+        and stored.get("scheme") == FINGERPRINT_SCHEME
+    ):
+        digest = stored["sha256"]
+    else:
+        digest = _merkle_sha256(path, FINGERPRINT_BLOCK_BYTES)
+        tmp = sidecar.with_name(f"{sidecar.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_text(
+                json.dumps(
+                    {
+                        "ident": ident,
+                        "scheme": FINGERPRINT_SCHEME,
+                        "block": FINGERPRINT_BLOCK_BYTES,
+                        "sha256": digest,
+                    }
+                )
+            )
+            os.replace(tmp, sidecar)
+        except OSError:  # read-only data directory: keep the in-memory memo only
+            pass
+    _FINGERPRINTS[key] = digest
+    return digest
+
+
 def sha256_text(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
-def load_cache() -> Dict[str, str]:
-    if CACHE_FILE.exists():
-        return json.loads(CACHE_FILE.read_text())
-    return {}
+class RunCache:
+    """Idempotency-key -> run id store in SQLite (WAL) with an in-memory LRU front.
+
+    Inserts are atomic across processes (first writer wins); entries older than
+    ``ttl`` seconds are ignored and the oldest rows are trimmed beyond ``max_entries``.
+    """
+
+    def __init__(
+        self, path: Path, ttl: float = 0, max_entries: int = 0, front_size: int = 1024
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.front_size = front_size
+        self._front: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs"
+                " (key TEXT PRIMARY KEY, run_id TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS runs_created ON runs (created)")
+            self._local.conn = conn
+            self._import_legacy(conn)
+        return conn
+
+    def _import_legacy(self, conn: sqlite3.Connection) -> None:
+        if (
+            not CACHE_FILE.exists()
+            or conn.execute("SELECT 1 FROM runs LIMIT 1").fetchone()
+        ):
+            return
+        now = time.time()
+        rows = [
+            (_digest(k), v, now) for k, v in json.loads(CACHE_FILE.read_text()).items()
+        ]
+        conn.executemany("INSERT OR IGNORE INTO runs VALUES (?, ?, ?)", rows)
 
+    def _fresh(self, created: float) -> bool:
+        return not self.ttl or time.time() - created < self.ttl
 
-def save_cache(cache: Dict[str, str]) -> None:
-    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
-    CACHE_FILE.write_text(json.dumps(cache))
+    def _remember(self, digest: str, run_id: str, created: float) -> None:
+        with self._lock:
+            self._front[digest] = (run_id, created)
+            self._front.move_to_end(digest)
+            while len(self._front) > self.front_size:
+                self._front.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        digest = _digest(key)
+        with self._lock:
+            hit = self._front.get(digest)
+        if hit is None:
+            row = (
+                self._conn()
+                .execute("SELECT run_id, created FROM runs WHERE key = ?", (digest,))
+                .fetchone()
+            )
+            if row is not None:
+                hit = (row[0], row[1])
+                self._remember(digest, *hit)
+        fresh = hit is not None and self._fresh(hit[1])
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit[0] if fresh else None
+
+    def put(self, key: str, run_id: str) -> str:
+        """Insert ``run_id`` unless a fresh entry exists; returns the stored run id."""
+        digest = _digest(key)
+        now = time.time()
+        conn = self._conn()
+        if self.ttl:
+            conn.execute(
+                "DELETE FROM runs WHERE key = ? AND created < ?",
+                (digest, now - self.ttl),
+            )
+        conn.execute(
+            "INSERT OR IGNORE INTO runs VALUES (?, ?, ?)", (digest, run_id, now)
+        )
+        stored, created = conn.execute(
+            "SELECT run_id, created FROM runs WHERE key = ?", (digest,)
+        ).fetchone()
+        self._remember(digest, stored, created)
+        self._inserts += 1
+        if self._inserts % 64 == 0:
+            self.evict()
+        return stored
+
+    def evict(self) -> None:
+        conn = self._conn()
+        if self.ttl:
+            conn.execute(
+                "DELETE FROM runs WHERE created < ?", (time.time() - self.ttl,)
+            )
+        if self.max_entries:
+            conn.execute(
+                "DELETE FROM runs WHERE key IN"
+                " (SELECT key FROM runs ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+def _digest(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+RUN_CACHE = RunCache(CACHE_DB, CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES)
+METRICS.register(lambda: cache_gauges("run", RUN_CACHE.hits, RUN_CACHE.misses))
 
 
 def cache_get_or_set(key: str, run_id: Optional[str] = None) -> Optional[str]:
-    cache = load_cache()
-    if key in cache:
-        return cache[key]
+    existing = RUN_CACHE.get(key)
+    if existing:
+        return existing
     if run_id:
-        cache[key] = run_id
-        save_cache(cache)
+        RUN_CACHE.put(key, run_id)
     return None
 
 
-def create_manifest(run_dir: Path, prov: Provenance) -> Path:
+@lru_cache(maxsize=1)
+def environment_snapshot() -> Tuple[str, Path]:
+    """Installed packages, Python and platform, stored content-addressed under ENV_DIR.
+
+    Computed once per process from ``importlib.metadata`` instead of ``pip freeze``.
+    """
+    packages = {
+        f"{dist.metadata['Name']}=={dist.version}"
+        for dist in importlib.metadata.distributions()
+        if dist.metadata["Name"]
+    }
+    snapshot = {
+        "python": sys.version,
+        "platform": platform.platform(),
+        "packages": sorted(packages, key=str.lower),
+    }
+    text = json.dumps(snapshot, indent=2, sort_keys=True)
+    digest = sha256_text(text)
+    path = ENV_DIR / f"{digest}.json"
+    if not path.exists():
+        ENV_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(text)
+        os.replace(tmp, path)
+    return digest, path
+
+
+def create_manifest(
+    run_dir: Path, prov: Provenance, stages: Optional[Dict[str, float]] = None
+) -> Path:
+    env_hash, env_path = environment_snapshot()
     manifest: Dict[str, Any] = {
         "plan_hash": prov.plan_hash,
         "dataset_hash": prov.dataset_hash,
+        "dataset_hash_scheme": {
+            "name": FINGERPRINT_SCHEME,
+            "block_bytes": FINGERPRINT_BLOCK_BYTES,
+        },
         "seed": prov.seed,
         "start_time": prov.start_time,
         "end_time": prov.end_time,
+        "parent_dataset_version": prov.parent_version,
         "python": sys.version,
         "platform": platform.platform(),
+        "environment_hash": env_hash,
+        "environment": str(env_path),
+        "stages": stages or {},
     }
-    try:
-        pip = subprocess.check_output([sys.executable, "-m", "pip", "freeze"]).decode()
-        manifest["pip_freeze"] = pip.splitlines()
-    except Exception:  # pragma: no cover
-        manifest["pip_freeze"] = []
     path = run_dir / "manifest.json"
     path.write_text(json.dumps(manifest, indent=2))
     return path
@@ -1,26 +1,162 @@
 from __future__ import annotations
 
+import json
 import shutil
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
-from jinja2 import Environment, FileSystemLoader
+from .provenance import sha256_text
+from .settings import RENDER_MEMO_ENTRIES, RENDER_WORKERS, ROOT_DIR
+from .tracing import METRICS, cache_gauges, span
 
-from .settings import ROOT_DIR
+STATUS_FILE = "artifacts.json"
 
-env = Environment(loader=FileSystemLoader(str(ROOT_DIR / "app" / "templates")))
 
+@lru_cache(maxsize=None)
+def _template(name: str = "evidence_card.md.j2"):
+    from jinja2 import (
+        Environment,
+        FileSystemLoader,
+    )  # only needed once a card is rendered
 
-def render_card(plan_yaml: str, results: Dict[str, Any], run_dir: Path) -> Dict[str, str]:
-    tpl = env.get_template("evidence_card.md.j2")
-    md = tpl.render(plan_yaml=plan_yaml, results=results)
-    md_path = run_dir / "evidence_card.md"
-    md_path.write_text(md)
+    env = Environment(loader=FileSystemLoader(str(ROOT_DIR / "app" / "templates")))
+    return env.get_template(name)
+
+
+def render_key(plan_yaml: str, results: Dict[str, Any]) -> str:
+    return sha256_text(
+        plan_yaml + "\0" + json.dumps(results, sort_keys=True, default=str)
+    )
+
+
+def render_card(
+    plan_yaml: str, results: Dict[str, Any], run_dir: Path
+) -> Dict[str, Any]:
+    start = time.perf_counter()
+    with span("render_markdown"):
+        md = _template().render(plan_yaml=plan_yaml, results=results)
+        md_path = run_dir / "evidence_card.md"
+        md_path.write_text(md)
+    timings = {"markdown": time.perf_counter() - start}
     pdf_path = run_dir / "evidence_card.pdf"
     pdf = ""
     if shutil.which("pandoc"):
-        import subprocess
-
-        subprocess.run(["pandoc", md_path, "-o", pdf_path], check=False)
+        start = time.perf_counter()
+        with span("render_pdf"):
+            subprocess.run(["pandoc", md_path, "-o", pdf_path], check=False)
+        timings["pdf"] = time.perf_counter() - start
         pdf = str(pdf_path)
-    return {"card_md": str(md_path), "card_pdf": pdf}
+    return {"card_md": str(md_path), "card_pdf": pdf, "timings": timings}
+
+
+def artifact_status(run_dir: Path) -> Dict[str, Any] | None:
+    path = run_dir / STATUS_FILE
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def _write_status(run_dir: Path, status: Dict[str, Any]) -> None:
+    tmp = run_dir / f"{STATUS_FILE}.tmp"
+    tmp.write_text(json.dumps(status, indent=2))
+    tmp.replace(run_dir / STATUS_FILE)
+
+
+class RenderPool:
+    """Bounded background rendering of evidence cards with per-run status.
+
+    Identical (plan, results) pairs are rendered once: a run that already holds
+    the artifacts is left alone and other runs get a copy of them. The most
+    recent ``memo_entries`` rendered keys are remembered for copying.
+    """
+
+    def __init__(self, workers: int, memo_entries: int = RENDER_MEMO_ENTRIES) -> None:
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="render"
+        )
+        self._inflight: Dict[Tuple[str, Path], Future] = {}
+        self._rendered: "OrderedDict[str, Path]" = OrderedDict()
+        self.memo_entries = memo_entries
+        self._lock = threading.Lock()
+        self.stats = {"rendered": 0, "deduplicated": 0, "failed": 0, "seconds": 0.0}
+
+    def submit(
+        self, plan_yaml: str, results: Dict[str, Any], run_dir: Path
+    ) -> Dict[str, Any]:
+        key = render_key(plan_yaml, results)
+        status = artifact_status(run_dir)
+        if status and status["key"] == key and status["state"] == "done":
+            with self._lock:
+                self.stats["deduplicated"] += 1
+            return status
+        with self._lock:
+            if (key, run_dir) in self._inflight:
+                self.stats["deduplicated"] += 1
+                return artifact_status(run_dir) or {"key": key, "state": "pending"}
+            status = {"key": key, "state": "pending"}
+            _write_status(run_dir, status)
+            fut = self._pool.submit(self._render, key, plan_yaml, results, run_dir)
+            self._inflight[(key, run_dir)] = fut
+        fut.add_done_callback(lambda _: self._forget(key, run_dir))
+        return status
+
+    def _forget(self, key: str, run_dir: Path) -> None:
+        with self._lock:
+            self._inflight.pop((key, run_dir), None)
+
+    def _render(
+        self, key: str, plan_yaml: str, results: Dict[str, Any], run_dir: Path
+    ) -> None:
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                source = self._rendered.get(key)
+                if source is not None:
+                    self._rendered.move_to_end(key)
+            if source is not None and (source / "evidence_card.md").exists():
+                card = self._copy(source, run_dir)
+                with self._lock:
+                    self.stats["deduplicated"] += 1
+            else:
+                card = render_card(plan_yaml, results, run_dir)
+                with self._lock:
+                    self._rendered[key] = run_dir
+                    while len(self._rendered) > self.memo_entries:
+                        self._rendered.popitem(last=False)
+                    self.stats["rendered"] += 1
+        except Exception as exc:
+            with self._lock:
+                self.stats["failed"] += 1
+            _write_status(run_dir, {"key": key, "state": "failed", "error": str(exc)})
+            return
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats["seconds"] += elapsed
+        card["timings"]["total"] = elapsed
+        _write_status(run_dir, {"key": key, "state": "done", **card})
+
+    @staticmethod
+    def _copy(source: Path, run_dir: Path) -> Dict[str, Any]:
+        card: Dict[str, Any] = {"card_md": "", "card_pdf": "", "timings": {}}
+        for field, name in (
+            ("card_md", "evidence_card.md"),
+            ("card_pdf", "evidence_card.pdf"),
+        ):
+            if (source / name).exists():
+                shutil.copyfile(source / name, run_dir / name)
+                card[field] = str(run_dir / name)
+        return card
+
+
+RENDERS = RenderPool(RENDER_WORKERS)
+METRICS.register(
+    lambda: cache_gauges(
+        "render", RENDERS.stats["deduplicated"], RENDERS.stats["rendered"]
+    )
+)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .settings import RESAMPLE_CHUNK, RESAMPLE_CHUNK_BYTES, RESAMPLE_WORKERS, RESAMPLES
+
+BOOTSTRAP, PERMUTATION = 0, 1
+CELL_BYTES = 16  # an int64 index and a float64 draw per resampled value
+
+_POOLS: Dict[int, ProcessPoolExecutor] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def worker_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool of ``workers`` spawn workers, shared by every caller in this
+    process."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _POOLS[workers] = pool
+        return pool
+
+
+def pool_map(
+    fn: Callable[..., Any], argsets: List[Tuple[Any, ...]], workers: int
+) -> List[Any]:
+    """``fn`` over ``argsets`` on the shared pool; a broken pool is dropped so the
+    next call starts a fresh one."""
+    pool = worker_pool(workers)
+    try:
+        return list(pool.map(fn, *zip(*argsets)))
+    except BrokenProcessPool:
+        with _POOLS_LOCK:
+            if _POOLS.get(workers) is pool:
+                del _POOLS[workers]
+        raise
+
+
+def budget_chunk(chunk: int, width: int, budget: int = RESAMPLE_CHUNK_BYTES) -> int:
+    """``chunk`` capped so a chunk of ``width``-value resamples fits in ``budget``
+    bytes."""
+    return max(1, min(chunk, budget // (CELL_BYTES * max(width, 1))))
+
+
+def chunk_seeds(
+    seed: int, stream: int, resamples: int, chunk: int
+) -> List[Tuple[int, np.random.SeedSequence]]:
+    """Split ``resamples`` into chunks, each with its own child seed.
+
+    Chunk ``i`` always gets the same child of ``SeedSequence([seed, stream])``, so
+    results depend only on the seed and chunk size, not on how chunks are scheduled.
+    """
+    sizes = [min(chunk, resamples - start) for start in range(0, resamples, chunk)]
+    return list(zip(sizes, np.random.SeedSequence([seed, stream]).spawn(len(sizes))))
+
+
+def _bootstrap_chunk(
+    a: np.ndarray, b: np.ndarray, size: int, seq: np.random.SeedSequence
+) -> np.ndarray:
+    rng = np.random.default_rng(seq)
+    ia = rng.integers(0, len(a), size=(size, len(a)))
+    ib = rng.integers(0, len(b), size=(size, len(b)))
+    return b[ib].mean(axis=1) - a[ia].mean(axis=1)
+
+
+def _permutation_chunk(
+    a: np.ndarray, b: np.ndarray, size: int, seq: np.random.SeedSequence
+) -> np.ndarray:
+    rng = np.random.default_rng(seq)
+    shuffled = rng.permuted(
+        np.broadcast_to(np.concatenate([a, b]), (size, len(a) + len(b))), axis=1
+    )
+    return shuffled[:, len(a) :].mean(axis=1) - shuffled[:, : len(a)].mean(axis=1)
+
+
+def _run(
+    fn: Callable[..., np.ndarray],
+    a: np.ndarray,
+    b: np.ndarray,
+    chunks: List[Tuple[int, Any]],
+    workers: int,
+) -> np.ndarray:
+    if workers > 1 and len(chunks) > 1:
+        parts = pool_map(fn, [(a, b, size, seq) for size, seq in chunks], workers)
+    else:
+        parts = [fn(a, b, size, seq) for size, seq in chunks]
+    return np.concatenate(parts) if parts else np.empty(0)
+
+
+def resample_diff(
+    a,
+    b,
+    seed: int,
+    bootstrap: bool = True,
+    permutation: bool = True,
+    resamples: int = RESAMPLES,
+    chunk: int = RESAMPLE_CHUNK,
+    workers: int = RESAMPLE_WORKERS,
+    alpha: float = 0.05,
+) -> Dict[str, Any]:
+    """Percentile bootstrap CI and two-sided permutation p-value for
+    ``mean(b) - mean(a)``.
+
+    Index matrices are drawn a chunk of resamples at a time; ``chunk`` is capped
+    so a chunk stays within ``RESAMPLE_CHUNK_BYTES`` per worker, which makes the
+    effective chunk (and so the draws) depend on the sample sizes as well.
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    a, b = a[~np.isnan(a)], b[~np.isnan(b)]
+    out: Dict[str, Any] = {"resamples": resamples}
+    if not len(a) or not len(b):
+        return out
+    chunk = budget_chunk(chunk, len(a) + len(b))
+    if bootstrap:
+        dist = _run(
+            _bootstrap_chunk,
+            a,
+            b,
+            chunk_seeds(seed, BOOTSTRAP, resamples, chunk),
+            workers,
+        )
+        low, high = np.quantile(dist, [alpha / 2, 1 - alpha / 2])
+        out["bootstrap_ci"] = [float(low), float(high)]
+    if permutation:
+        observed = b.mean() - a.mean()
+        dist = _run(
+            _permutation_chunk,
+            a,
+            b,
+            chunk_seeds(seed, PERMUTATION, resamples, chunk),
+            workers,
+        )
+        extreme = np.count_nonzero(np.abs(dist) >= abs(observed) - 1e-12)
+        out["permutation_p"] = float((extreme + 1) / (resamples + 1))
+    return out
@@ -45,11 +45,26 @@ class PowerSpec(BaseModel):
     p1_assumed: Optional[float] = None
     p2_assumed: Optional[float] = None
     assumed_hr: Optional[float] = None
+    simulate_from: str = "observed"
+    mc_se: Optional[float] = None
+
+    @validator("simulate_from")
+    def _simulate_from(cls, v):
+        if v not in ("observed", "parametric"):
+            raise ValueError("simulate_from must be 'observed' or 'parametric'")
+        return v
 
 
 class AnalysisSpec(BaseModel):
     stats: List[str]
     power: PowerSpec
+    comparisons: str = "baseline"
+
+    @validator("comparisons")
+    def _comparisons(cls, v):
+        if v not in ("baseline", "pairwise"):
+            raise ValueError("comparisons must be 'baseline' or 'pairwise'")
+        return v
 
 
 class EndpointSpec(BaseModel):
@@ -83,6 +98,15 @@ class PlanModel(BaseModel):
     seed: int = 0
 
 
+class SweepSpec(BaseModel):
+    """Grid of values for one threshold predicate of a cohort."""
+
+    cohort: str = "proposed"
+    col: str
+    op: FilterOp
+    values: List[float]
+
+
 class DataDictColumn(BaseModel):
     role: str
     endpoint_type: Optional[str] = None
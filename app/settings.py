@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
 
 ALLOWED_INPUT_PREFIX = "local://data/"
@@ -8,4 +9,56 @@ SMALL_CELL_DEFAULT = 10
 ROOT_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = ROOT_DIR / "data"
 RUNS_DIR = ROOT_DIR / "runs"
-CACHE_FILE = RUNS_DIR / "cache.json"
+CACHE_FILE = RUNS_DIR / "cache.json"  # legacy store, imported into CACHE_DB once
+CACHE_DB = RUNS_DIR / "cache.sqlite"
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", 0))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 100_000))
+DATASET_CACHE_BYTES = int(os.environ.get("DATASET_CACHE_BYTES", 1 << 30))
+MASK_CACHE_BYTES = int(os.environ.get("MASK_CACHE_BYTES", 256 << 20))
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", min(8, os.cpu_count() or 1)))
+JOBS_DB = RUNS_DIR / "jobs.sqlite"
+ENV_DIR = RUNS_DIR / "env"
+JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", 2))
+JOBS_MAX_PENDING = int(os.environ.get("JOBS_MAX_PENDING", 64))
+JOBS_LEASE_SECONDS = float(os.environ.get("JOBS_LEASE_SECONDS", 3600))
+FINGERPRINT_BLOCK_BYTES = int(os.environ.get("FINGERPRINT_BLOCK_BYTES", 64 << 20))
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 2))
+RENDER_MEMO_ENTRIES = int(os.environ.get("RENDER_MEMO_ENTRIES", 1024))
+KM_CURVE_POINTS = 200
+RESAMPLES = int(os.environ.get("RESAMPLES", 2000))
+RESAMPLE_CHUNK = int(os.environ.get("RESAMPLE_CHUNK", 250))
+RESAMPLE_WORKERS = int(os.environ.get("RESAMPLE_WORKERS", 1))
+RESAMPLE_CHUNK_BYTES = int(
+    os.environ.get("RESAMPLE_CHUNK_BYTES", 64 << 20)
+)  # per worker
+SIM_MAX_TRIALS = int(os.environ.get("SIM_MAX_TRIALS", 20_000))
+SIM_MIN_TRIALS = int(os.environ.get("SIM_MIN_TRIALS", 1000))
+SIM_CHUNK = int(os.environ.get("SIM_CHUNK", 500))
+SIM_CELLS = int(os.environ.get("SIM_CELLS", 1 << 22))  # draws per resampled chunk
+SIM_SE = float(os.environ.get("SIM_SE", 0.005))
+SIM_MAX_ROWS = int(
+    os.environ.get("SIM_MAX_ROWS", 1 << 27)
+)  # simulated rows per run, for O(n) trials
+SIM_WORKERS = int(os.environ.get("SIM_WORKERS", RESAMPLE_WORKERS))
+STREAMING_THRESHOLD_BYTES = int(os.environ.get("STREAMING_THRESHOLD_BYTES", 2 << 30))
+STREAM_BATCH_ROWS = int(os.environ.get("STREAM_BATCH_ROWS", 1 << 18))
+STREAM_EVENT_TIMES = int(
+    os.environ.get("STREAM_EVENT_TIMES", 1 << 14)
+)  # event-time bins kept
+READ_WORKERS = int(os.environ.get("READ_WORKERS", min(8, os.cpu_count() or 1)))
+IPC_DIR = RUNS_DIR / "ipc"
+ARROW_IPC = os.environ.get("ARROW_IPC", "0") == "1"
+TRACING = os.environ.get("TRACING", "1") == "1"
+PREWARM = os.environ.get("PREWARM", "0") == "1"
+PREWARM_DATASETS = [
+    uri
+    for uri in os.environ.get("PREWARM_DATASETS", "local://data/data_dict.yaml").split(
+        ","
+    )
+    if uri
+]
+STATE_DIR = RUNS_DIR / "state"
+STATE_TTL_SECONDS = float(
+    os.environ.get("STATE_TTL_SECONDS", 7 * 86400)
+)  # unused row-group states
+INCREMENTAL = os.environ.get("INCREMENTAL", "0") == "1"
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from scipy import optimize, stats
+
+from .resampling import chunk_seeds, pool_map
+from .settings import (
+    SIM_CELLS,
+    SIM_CHUNK,
+    SIM_MAX_ROWS,
+    SIM_MAX_TRIALS,
+    SIM_MIN_TRIALS,
+    SIM_SE,
+    SIM_WORKERS,
+)
+from .survival import logrank_terms
+
+SIMULATION = 2  # SeedSequence stream, after resampling's BOOTSTRAP and PERMUTATION
+
+
+def _critical(alpha: float) -> float:
+    return stats.norm.ppf(1 - alpha / 2)
+
+
+def _z_rejections(delta: np.ndarray, se: np.ndarray, alpha: float) -> int:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.abs(delta) / se
+    return int(np.count_nonzero(np.nan_to_num(z) > _critical(alpha)))
+
+
+def _normal_chunk(
+    spec: Tuple[float, float],
+    n: int,
+    alpha: float,
+    size: int,
+    seq: np.random.SeedSequence,
+) -> int:
+    """Two-arm normal trials; arm means and variances are drawn from their
+    sampling distributions, so a trial costs O(1) instead of O(n)."""
+    effect, sp = spec
+    rng = np.random.default_rng(seq)
+    means = rng.normal([0.0, effect], sp / np.sqrt(n), size=(size, 2))
+    variances = sp**2 * rng.chisquare(n - 1, size=(size, 2)) / (n - 1)
+    return _z_rejections(
+        means[:, 1] - means[:, 0], np.sqrt(variances.mean(axis=1) * 2 / n), alpha
+    )
+
+
+def _resample_chunk(
+    spec: Tuple[np.ndarray, np.ndarray],
+    n: int,
+    alpha: float,
+    size: int,
+    seq: np.random.SeedSequence,
+) -> int:
+    """Two-arm trials of ``n`` rows drawn with replacement from each observed arm."""
+    a, b = spec
+    rng = np.random.default_rng(seq)
+    xa = a[rng.integers(0, len(a), size=(size, n))]
+    xb = b[rng.integers(0, len(b), size=(size, n))]
+    sp = np.sqrt((xa.var(axis=1, ddof=1) + xb.var(axis=1, ddof=1)) / 2)
+    return _z_rejections(xb.mean(axis=1) - xa.mean(axis=1), sp * np.sqrt(2 / n), alpha)
+
+
+def _binomial_chunk(
+    spec: Tuple[float, float],
+    n: int,
+    alpha: float,
+    size: int,
+    seq: np.random.SeedSequence,
+) -> int:
+    rng = np.random.default_rng(seq)
+    p = rng.binomial(n, spec, size=(size, 2)) / n
+    se = np.sqrt((p * (1 - p)).sum(axis=1) / n)
+    return _z_rejections(p[:, 1] - p[:, 0], se, alpha)
+
+
+def _logrank_rejections(
+    time: np.ndarray, event: np.ndarray, arm: np.ndarray, alpha: float
+) -> int:
+    """Log-rank tests of ``size`` trials at once, one trial per row, over each
+    trial's distinct times as in :func:`app.survival.logrank`."""
+    size, rows = time.shape
+    order = np.argsort(time, axis=1, kind="stable")
+    time = np.take_along_axis(time, order, axis=1)
+    event = np.take_along_axis(event, order, axis=1)
+    arm = np.take_along_axis(arm, order, axis=1)
+    first = np.ones(time.shape, dtype=bool)
+    first[:, 1:] = time[:, 1:] != time[:, :-1]
+    # one id per (trial, distinct time); each row starts a new id
+    group = np.cumsum(first.ravel()) - 1
+    d = np.bincount(group, weights=event.ravel())
+    d_b = np.bincount(group, weights=(event * arm).ravel())
+    trial, start = np.nonzero(first)
+    at_risk_b = np.cumsum(arm[:, ::-1], axis=1)[:, ::-1]
+    o_e, var = logrank_terms(
+        d, d_b, (rows - start).astype(float), at_risk_b[trial, start]
+    )
+    o_e = np.bincount(trial, weights=o_e, minlength=size)
+    var = np.bincount(trial, weights=var, minlength=size)
+    return _z_rejections(o_e, np.sqrt(var), alpha)
+
+
+def _arms(n: int, size: int) -> np.ndarray:
+    return np.broadcast_to(np.repeat([0.0, 1.0], n), (size, 2 * n))
+
+
+def _exponential_chunk(
+    spec: Tuple[float, float],
+    n: int,
+    alpha: float,
+    size: int,
+    seq: np.random.SeedSequence,
+) -> int:
+    """Exponential event times with hazards 1 and ``hr`` under exponential censoring."""
+    hr, censoring = spec
+    rng = np.random.default_rng(seq)
+    arm = _arms(n, size)
+    time = rng.exponential(1 / np.where(arm > 0, hr, 1.0))
+    censor = (
+        rng.exponential(1 / censoring, size=time.shape)
+        if censoring > 0
+        else np.full(time.shape, np.inf)
+    )
+    return _logrank_rejections(
+        np.minimum(time, censor), (time <= censor).astype(float), arm, alpha
+    )
+
+
+def _resample_survival_chunk(
+    spec: Tuple[np.ndarray, np.ndarray],
+    n: int,
+    alpha: float,
+    size: int,
+    seq: np.random.SeedSequence,
+) -> int:
+    """Log-rank trials of ``n`` (time, event) pairs drawn with replacement per
+    observed arm."""
+    a, b = spec
+    rng = np.random.default_rng(seq)
+    ia = rng.integers(0, a.shape[1], size=(size, n))
+    ib = rng.integers(0, b.shape[1], size=(size, n))
+    time = np.concatenate([a[0][ia], b[0][ib]], axis=1)
+    event = np.concatenate([a[1][ia], b[1][ib]], axis=1)
+    return _logrank_rejections(time, event, _arms(n, size), alpha)
+
+
+def censoring_rate(hr: float, event_rate: float) -> float:
+    """Exponential censoring rate giving ``event_rate`` events per patient on
+    average over arms with hazards 1 and ``hr``; 0 means no censoring."""
+    if not np.isfinite(event_rate) or event_rate >= 1:
+        return 0.0
+    if event_rate <= 0:
+        raise ValueError("simulation needs a positive event rate")
+    return optimize.brentq(
+        lambda c: (1 / (1 + c) + hr / (hr + c)) / 2 - event_rate, 1e-12, 1e12
+    )
+
+
+def simulate(
+    fn: Callable[..., int],
+    spec: Any,
+    n: int,
+    alpha: float,
+    seed: int,
+    se_target: float = SIM_SE,
+    max_trials: int = SIM_MAX_TRIALS,
+    chunk: int = SIM_CHUNK,
+    workers: int = SIM_WORKERS,
+) -> Dict[str, Any]:
+    """Rejection rate of ``fn`` trials, stopping once its Monte Carlo standard
+    error reaches ``se_target`` (after at least ``SIM_MIN_TRIALS``).
+
+    Chunks get their seeds from :func:`app.resampling.chunk_seeds` and the
+    stopping rule is checked after each chunk in order, so the result depends
+    on the seed and chunk size but not on ``workers``.
+    """
+    chunks = chunk_seeds(seed, SIMULATION, max_trials, chunk)
+    hits = trials = 0
+    parallel = workers > 1 and len(chunks) > 1
+    step = workers if parallel else 1
+    for start in range(0, len(chunks), step):
+        batch = chunks[start : start + step]
+        if parallel:
+            counts = pool_map(
+                fn, [(spec, n, alpha, size, seq) for size, seq in batch], workers
+            )
+        else:
+            counts = [fn(spec, n, alpha, size, seq) for size, seq in batch]
+        for (size, _), count in zip(batch, counts):
+            hits += count
+            trials += size
+            rate = hits / trials
+            if (
+                trials >= SIM_MIN_TRIALS
+                and np.sqrt(rate * (1 - rate) / trials) <= se_target
+            ):
+                break
+        else:
+            continue
+        break
+    rate = hits / trials if trials else np.nan
+    return {
+        "power": rate,
+        "mc_se": float(np.sqrt(rate * (1 - rate) / trials)) if trials else np.nan,
+        "trials": trials,
+    }
+
+
+def simulated_power(
+    kind: str,
+    params: Dict[str, float],
+    n: int,
+    alpha: float,
+    seed: int,
+    sample: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    se_target: Optional[float] = None,
+    **kwargs: Any,
+) -> Dict[str, Any]:
+    """Monte Carlo power of the plan's test at ``n`` per arm.
+
+    With ``sample`` (the observed arms; ``(2, rows)`` time/event stacks for
+    time-to-event) trials resample the cohorts, continuous ones shifted to the
+    effect in ``params``; otherwise they come from the parametric model behind
+    :func:`app.power.power`. Binary trials are always binomial, which is what
+    resampling 0/1 outcomes amounts to.
+
+    Trials that draw every row (resampled or time-to-event) are capped at
+    ``SIM_MAX_ROWS`` rows in total, so a large autotuned ``n`` gets fewer trials
+    and a larger Monte Carlo error instead of an unbounded run; ``capped`` says
+    whether the cap applied.
+    """
+    se_target = SIM_SE if se_target is None else se_target
+    if not all(np.isfinite(value) for value in params.values()) and sample is None:
+        return {"power": np.nan, "mc_se": np.nan, "trials": 0, "model": "parametric"}
+    if kind == "continuous":
+        if sample is not None:
+            a, b = sample
+            fn, spec, model = (
+                _resample_chunk,
+                (a, b - b.mean() + a.mean() + params["effect"]),
+                "observed",
+            )
+        else:
+            fn, spec, model = (
+                _normal_chunk,
+                (params["effect"], params["sp"]),
+                "parametric",
+            )
+    elif kind == "binary":
+        fn, spec, model = _binomial_chunk, (params["p1"], params["p2"]), "parametric"
+    elif sample is not None:
+        fn, spec, model = _resample_survival_chunk, sample, "observed"
+    else:
+        spec = (params["hr"], censoring_rate(params["hr"], params["event_rate"]))
+        fn, model = _exponential_chunk, "parametric"
+    max_trials = kwargs.pop("max_trials", SIM_MAX_TRIALS)
+    capped = False
+    if fn not in (_normal_chunk, _binomial_chunk) and max_trials * 2 * n > SIM_MAX_ROWS:
+        max_trials, capped = max(1, SIM_MAX_ROWS // (2 * n)), True
+    chunk = max(1, min(kwargs.pop("chunk", SIM_CHUNK), SIM_CELLS // max(n, 1)))
+    out = simulate(
+        fn, spec, n, alpha, seed, se_target, max_trials, chunk=chunk, **kwargs
+    )
+    out["model"] = model
+    out["capped"] = capped
+    return out
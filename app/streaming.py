@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from .datasets import (
+    apply_dtypes,
+    cohort_filters,
+    open_dataset,
+    plan_columns,
+    plan_pushdown,
+    read_fragments,
+)
+from .executor import (
+    bin_from_moments,
+    cohort_moments,
+    cohort_order,
+    comparisons,
+    cont_from_moments,
+    endpoint_power,
+    event_rate,
+    power_results,
+    subgroup_categories,
+)
+from .fairness import _combine, _py, cell_counts, comparison_records, encode
+from .filters import compile_filter
+from .schemas import DataDict, PlanModel
+from .settings import (
+    READ_WORKERS,
+    SMALL_CELL_DEFAULT,
+    STREAM_BATCH_ROWS,
+    STREAM_EVENT_TIMES,
+)
+from .survival import (
+    bound_event_tables,
+    coarsen_event_tables,
+    event_tables,
+    merge_event_tables,
+    select_arms,
+    summarize,
+)
+from .tracing import span
+
+
+@dataclass
+class Moments:
+    """Row count, non-null count, mean and sum of squared deviations, mergeable
+    across batches with Chan's parallel update."""
+
+    rows: int = 0
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    def update(self, values: np.ndarray) -> None:
+        valid = values[~np.isnan(values)]
+        part = Moments(len(values), len(valid))
+        if len(valid):
+            part.mean = float(valid.mean())
+            part.m2 = float(((valid - part.mean) ** 2).sum())
+        self.merge(part)
+
+    def merge(self, other: "Moments") -> None:
+        count = self.count + other.count
+        if other.count:
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.rows += other.rows
+        self.count = count
+
+    @property
+    def mean_or_nan(self) -> float:
+        return self.mean if self.count else np.nan
+
+    @property
+    def sd(self) -> float:
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
+
+
+@dataclass
+class StreamState:
+    """Mergeable per-cohort accumulators for one plan, in :func:`cohort_order`
+    (baseline = 0, proposed = 1); subgroup ``cells`` cover those two only.
+
+    ``moments`` also carries the cohort row counts for time-to-event endpoints.
+    Event ``tables`` keep at most ``STREAM_EVENT_TIMES`` times; past that, times
+    are binned at ``time_bin`` (0 while they are exact).
+    """
+
+    moments: List[Moments] = field(default_factory=lambda: [Moments(), Moments()])
+    tables: Optional[Dict[str, np.ndarray]] = None
+    cells: Dict[str, List[Counter]] = field(default_factory=dict)
+    time_bin: float = 0.0
+
+    def add_tables(self, tables: Dict[str, np.ndarray], width: float = 0.0) -> None:
+        """Fold in event tables binned at ``width``."""
+        if self.tables is not None:
+            common = max(self.time_bin, width)
+            mine = (
+                coarsen_event_tables(self.tables, common)
+                if common > self.time_bin
+                else self.tables
+            )
+            theirs = coarsen_event_tables(tables, common) if common > width else tables
+            tables, width = merge_event_tables(mine, theirs), common
+        self.tables, self.time_bin = bound_event_tables(
+            tables, width, STREAM_EVENT_TIMES
+        )
+
+    def merge(self, other: "StreamState") -> None:
+        self.moments.extend(
+            Moments() for _ in range(len(other.moments) - len(self.moments))
+        )
+        for acc, part in zip(self.moments, other.moments):
+            acc.merge(part)
+        if other.tables is not None:
+            self.add_tables(other.tables, other.time_bin)
+        for key, tallies in other.cells.items():
+            mine = self.cells.setdefault(key, [Counter(), Counter()])
+            for tally, part in zip(mine, tallies):
+                tally.update(part)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "moments": [[m.rows, m.count, m.mean, m.m2] for m in self.moments],
+            "tables": (
+                None
+                if self.tables is None
+                else {key: value.tolist() for key, value in self.tables.items()}
+            ),
+            "time_bin": self.time_bin,
+            "cells": {
+                key: [
+                    [[list(cell), n] for cell, n in tally.items()] for tally in tallies
+                ]
+                for key, tallies in self.cells.items()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "StreamState":
+        tables = data["tables"]
+        return cls(
+            moments=[Moments(*values) for values in data["moments"]],
+            tables=(
+                None
+                if tables is None
+                else {
+                    key: np.asarray(
+                        value, dtype=np.int64 if key == "observed" else float
+                    )
+                    for key, value in tables.items()
+                }
+            ),
+            cells={
+                key: [
+                    Counter({tuple(cell): n for cell, n in tally}) for tally in tallies
+                ]
+                for key, tallies in data["cells"].items()
+            },
+            time_bin=data.get("time_bin", 0.0),
+        )
+
+
+def iter_batches(
+    plan: PlanModel,
+    dct: DataDict,
+    dataset: ds.Dataset,
+    fragment: ds.Fragment,
+    batch_rows: int = STREAM_BATCH_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """Projected, pushed-down record batches of one file as frames with the
+    dictionary's dtypes."""
+    batches = fragment.to_batches(
+        schema=dataset.schema,
+        columns=plan_columns(plan),
+        filter=plan_pushdown(plan, dataset.schema),
+        batch_size=batch_rows,
+    )
+    for batch in batches:
+        if batch.num_rows:
+            yield apply_dtypes(batch.to_pandas(), dct)
+
+
+def update(
+    state: StreamState, plan: PlanModel, dct: DataDict, chunk: pd.DataFrame
+) -> None:
+    """Fold one batch into ``state``."""
+    filters = cohort_filters(plan)
+    masks = np.stack(
+        [compile_filter(filters[name]).mask(chunk) for name in cohort_order(plan)]
+    )
+    state.moments.extend(Moments() for _ in range(len(masks) - len(state.moments)))
+    endpoint = plan.endpoint
+    if endpoint.type == "time_to_event":
+        val = endpoint.value
+        tables = event_tables(
+            chunk[val["time"]].to_numpy(float),
+            chunk[val["event"]].to_numpy(float),
+            masks,
+        )
+        state.add_tables(tables)
+        for acc, rows in zip(state.moments, masks.sum(axis=1)):
+            acc.rows += int(rows)
+    else:
+        y = chunk[endpoint.value].to_numpy(float, na_value=np.nan)
+        for acc, (rows, count, mean, m2) in zip(
+            state.moments, zip(*cohort_moments(masks, y))
+        ):
+            acc.merge(
+                Moments(int(rows), int(count), float(mean) if count else 0.0, float(m2))
+            )
+
+    categories = subgroup_categories(dct)
+    subgroups = plan.fairness.get("subgroups", [])
+    intersections = plan.fairness.get("intersections", [])
+    needed = list(
+        dict.fromkeys(subgroups + [c for key in intersections for c in key.split("*")])
+    )
+    encoded = {col: encode(chunk[col], categories.get(col)) for col in needed}
+    for key in subgroups + intersections:
+        cols = key.split("*")
+        codes, cells = _combine([encoded[c] for c in cols])
+        counts = cell_counts(codes, masks[:2], len(cells))
+        # batch codes depend on the labels seen so far, so merge by label
+        tallies = state.cells.setdefault(key, [Counter(), Counter()])
+        for tally, row in zip(tallies, counts):
+            for cell in np.flatnonzero(row):
+                tally[
+                    tuple(encoded[c][1][cells[cell, i]] for i, c in enumerate(cols))
+                ] += int(row[cell])
+
+
+def fairness_from_cells(
+    cells: Dict[str, List[Counter]],
+    n_proposed: int,
+    k: int,
+    categories: Dict[str, List[Any]],
+) -> Dict[str, Any]:
+    """Subgroup tables from label-keyed counts, in the same order as the
+    in-memory path."""
+    out: Dict[str, Any] = {}
+    for key, (base, prop) in cells.items():
+        cols = key.split("*")
+        labels: List[List[Any]] = []
+        for i, col in enumerate(cols):
+            declared = list(categories.get(col) or [])
+            seen = {cell[i] for cell in list(base) + list(prop)} - set(declared)
+            labels.append(declared + sorted((_py(v) for v in seen), key=str))
+        index = [{label: j for j, label in enumerate(lab)} for lab in labels]
+        keys = sorted(
+            {
+                tuple(index[i][v] for i, v in enumerate(cell))
+                for cell in list(base) + list(prop)
+            }
+        )
+        cells = np.array(keys, dtype=np.int64).reshape(len(keys), len(cols))
+        position = {cell: j for j, cell in enumerate(keys)}
+        counts = np.zeros((2, len(keys)), dtype=np.int64)
+        for arm, tally in enumerate((base, prop)):
+            for cell, count in tally.items():
+                counts[
+                    arm, position[tuple(index[i][v] for i, v in enumerate(cell))]
+                ] = count
+        out[key] = comparison_records(
+            cols, labels, cells, counts[0], counts[1], n_proposed, k
+        )
+    return out
+
+
+def analyze_streaming(
+    plan: PlanModel, dct: DataDict, batch_rows: int = STREAM_BATCH_ROWS
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Same results as :func:`app.executor.analyze`, reading the dataset a batch
+    at a time so memory is bounded by ``batch_rows`` and the accumulators.
+
+    Files are scanned on a thread pool into one state each, then merged in file
+    order, so the result does not depend on scheduling.
+    """
+    notes: List[str] = ["streaming execution: batches of {} rows".format(batch_rows)]
+    dataset = open_dataset(dct)
+    fragments = read_fragments(dataset, plan_pushdown(plan, dataset.schema))
+
+    def scan(fragment: ds.Fragment) -> StreamState:
+        part = StreamState()
+        for chunk in iter_batches(plan, dct, dataset, fragment, batch_rows):
+            update(part, plan, dct, chunk)
+        return part
+
+    state = StreamState()
+    with (
+        span("scan"),
+        ThreadPoolExecutor(
+            max_workers=max(1, min(READ_WORKERS, len(fragments)))
+        ) as pool,
+    ):
+        for part in pool.map(scan, fragments):
+            state.merge(part)
+    return finish(plan, dct, state, notes), notes
+
+
+def finish(
+    plan: PlanModel, dct: DataDict, state: StreamState, notes: List[str]
+) -> Dict[str, Any]:
+    endpoint = plan.endpoint
+    names = cohort_order(plan)
+    state.moments.extend(Moments() for _ in range(len(names) - len(state.moments)))
+    base, prop = state.moments[:2]
+    rate = np.nan
+    with span("stats"):
+        if endpoint.type == "time_to_event":
+            tables = state.tables or event_tables(
+                np.empty(0), np.empty(0), np.zeros((len(names), 0), dtype=bool)
+            )
+            pair = select_arms(tables, (0, 1))
+            res = summarize(pair)
+            rate = event_rate(pair)
+            if state.time_bin:
+                notes.append(
+                    "event times binned to multiples of {:g}"
+                    " to bound streaming memory".format(state.time_bin)
+                )
+        elif endpoint.type == "continuous":
+            res = cont_from_moments(
+                base.rows,
+                base.mean_or_nan,
+                base.sd,
+                prop.rows,
+                prop.mean_or_nan,
+                prop.sd,
+            )
+        else:
+            res = bin_from_moments(
+                base.rows, base.mean_or_nan, prop.rows, prop.mean_or_nan
+            )
+    if set(plan.analysis.stats) & {"bootstrap", "permutation"}:
+        notes.append("resampling skipped: not available in streaming execution")
+
+    results: Dict[str, Any] = {
+        "n_baseline": base.rows,
+        "n_proposed": prop.rows,
+        "stats": res,
+    }
+    rows = np.array([m.rows for m in state.moments])
+    # before power_results, whose autotune changes the plan's n and alpha
+    with span("comparisons"):
+        if endpoint.type == "time_to_event":
+            family = comparisons(plan, names, rows, tables=tables)
+        else:
+            mean = np.array([m.mean_or_nan for m in state.moments])
+            sd = np.array([m.sd for m in state.moments])
+            family = comparisons(plan, names, rows, mean, sd)
+    kind, params = endpoint_power(plan, res, rate)
+    pspec = plan.analysis.power
+    if (
+        pspec.method == "simulation"
+        and pspec.simulate_from == "observed"
+        and endpoint.type != "binary"
+    ):
+        notes.append(
+            "power simulated from the parametric model:"
+            " rows are not kept in streaming execution"
+        )
+    results.update(power_results(plan, kind, params, notes))
+    results["comparisons"] = family
+    k = plan.privacy.get("small_cell_k", SMALL_CELL_DEFAULT)
+    with span("fairness"):
+        results["fairness"] = fairness_from_cells(
+            state.cells, prop.rows, k, subgroup_categories(dct)
+        )
+    return results
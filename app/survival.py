@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Tuple
+
+import numpy as np
+from scipy import stats
+
+from .settings import KM_CURVE_POINTS
+
+
+def event_tables(time, event, masks: np.ndarray) -> Dict[str, np.ndarray]:
+    """Per-cohort event and observation counts at every unique time.
+
+    ``masks`` is a ``(K, N)`` boolean matrix; the times are sorted once and all
+    cohorts are counted with a single ``bincount`` each for events and rows.
+    Rows outside every cohort are ignored, so the tables do not depend on what
+    else the frame holds.
+    """
+    time = np.asarray(time, dtype=float)
+    event = np.asarray(event, dtype=float)
+    keep = ~np.isnan(time) & masks.any(axis=0)
+    times, inv = np.unique(time[keep], return_inverse=True)
+    cohort, rows = np.nonzero(masks[:, keep])
+    flat = cohort * len(times) + inv[rows]
+    size = len(masks) * len(times)
+    shape = (len(masks), len(times))
+    observed = np.bincount(flat, minlength=size).reshape(shape)
+    deaths = np.bincount(flat, weights=event[keep][rows], minlength=size).reshape(shape)
+    return {"times": times, "deaths": deaths, "observed": observed}
+
+
+def merge_event_tables(
+    a: Dict[str, np.ndarray], b: Dict[str, np.ndarray]
+) -> Dict[str, np.ndarray]:
+    """Sum two event tables over the union of their times."""
+    times = np.union1d(a["times"], b["times"])
+    out = {"times": times}
+    for key in ("deaths", "observed"):
+        merged = np.zeros((a[key].shape[0], len(times)), dtype=a[key].dtype)
+        merged[:, np.searchsorted(times, a["times"])] += a[key]
+        merged[:, np.searchsorted(times, b["times"])] += b[key]
+        out[key] = merged
+    return out
+
+
+def coarsen_event_tables(
+    tables: Dict[str, np.ndarray], width: float
+) -> Dict[str, np.ndarray]:
+    """Event tables with every time moved up to the next multiple of ``width``."""
+    times, inv = np.unique(
+        np.ceil(tables["times"] / width) * width, return_inverse=True
+    )
+    out = {"times": times}
+    for key in ("deaths", "observed"):
+        binned = np.zeros((tables[key].shape[0], len(times)), dtype=tables[key].dtype)
+        np.add.at(binned.T, inv, tables[key].T)
+        out[key] = binned
+    return out
+
+
+def bound_event_tables(
+    tables: Dict[str, np.ndarray], width: float, max_times: int
+) -> Tuple[Dict[str, np.ndarray], float]:
+    """Tables with at most ``max_times`` times, and the bin width used (0 = exact).
+
+    Once the exact times overflow, they are binned at the narrowest power-of-two
+    width that is at least ``width`` and ``span / max_times`` and fits. Such bins
+    nest, so tables built up by any split and merge order end at the same width
+    and the same counts.
+    """
+    times = tables["times"]
+    if not width and len(times) <= max_times:
+        return tables, 0.0
+    span = times[-1] - times[0] if len(times) else 0.0
+    width = max(width, 2.0 ** np.floor(np.log2(span / max_times)) if span > 0 else 0.0)
+    while len(np.unique(np.ceil(times / width))) > max_times:
+        width *= 2
+    return coarsen_event_tables(tables, width), float(width)
+
+
+def select_arms(tables: Dict[str, np.ndarray], arms) -> Dict[str, np.ndarray]:
+    """The rows of cohorts ``arms`` only, at the times where those cohorts have rows."""
+    arms = list(arms)
+    observed = tables["observed"][arms]
+    keep = observed.any(axis=0)
+    return {
+        "times": tables["times"][keep],
+        "deaths": tables["deaths"][arms][:, keep],
+        "observed": observed[:, keep],
+    }
+
+
+def km_from_tables(
+    tables: Dict[str, np.ndarray], alpha: float = 0.05
+) -> Dict[str, np.ndarray]:
+    """Kaplan-Meier estimates with exponential Greenwood bands, one row per cohort."""
+    deaths, observed = tables["deaths"], tables["observed"]
+    at_risk = np.cumsum(observed[:, ::-1], axis=1)[:, ::-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        step = np.where(at_risk > 0, 1 - deaths / at_risk, 1.0)
+        surv = np.cumprod(step, axis=1)
+        greenwood = np.cumsum(
+            np.where(at_risk > deaths, deaths / (at_risk * (at_risk - deaths)), 0.0),
+            axis=1,
+        )
+        log_s = np.log(surv)
+        z = stats.norm.ppf(1 - alpha / 2)
+        spread = z * np.sqrt(greenwood) / log_s
+        band_a = np.exp(-np.exp(np.log(-log_s) + spread))
+        band_b = np.exp(-np.exp(np.log(-log_s) - spread))
+    lower = np.where(surv < 1, np.minimum(band_a, band_b), 1.0)
+    upper = np.where(surv < 1, np.maximum(band_a, band_b), 1.0)
+    return {
+        "times": tables["times"],
+        "at_risk": at_risk,
+        "survival": surv,
+        "lower": lower,
+        "upper": upper,
+    }
+
+
+def median_times(times: np.ndarray, surv: np.ndarray) -> np.ndarray:
+    """First time each curve drops to 0.5 or below; ``inf`` if it never does."""
+    if not len(times):
+        return np.full(len(surv), np.inf)
+    below = np.nan_to_num(surv, nan=1.0) <= 0.5
+    return np.where(below.any(axis=1), times[below.argmax(axis=1)], np.inf)
+
+
+def logrank_terms(d, d_a, n, n_a) -> Tuple[np.ndarray, np.ndarray]:
+    """Observed minus expected events of arm ``a`` and the hypergeometric
+    variance at each distinct time, from all deaths ``d`` and at-risk ``n`` and
+    those of arm ``a``; tied deaths are pooled, as the log-rank test needs."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        o_e = d_a - np.where(n > 0, d * n_a / n, 0.0)
+        var = np.where(n > 1, d * n_a * (n - n_a) * (n - d) / (n**2 * (n - 1)), 0.0)
+    return o_e, var
+
+
+def logrank(tables: Dict[str, np.ndarray], a: int = 0, b: int = 1) -> Dict[str, float]:
+    """Log-rank test of cohort ``b`` vs ``a`` with the Peto hazard-ratio estimate.
+
+    ``log HR = (O_b - E_b) / V`` with standard error ``1 / sqrt(V)``, so the HR
+    interval agrees with the log-rank p-value.
+    """
+    deaths, observed = tables["deaths"][[a, b]], tables["observed"][[a, b]]
+    at_risk = np.cumsum(observed[:, ::-1], axis=1)[:, ::-1]
+    o_e, var = (
+        terms.sum()
+        for terms in logrank_terms(
+            deaths.sum(axis=0), deaths[0], at_risk.sum(axis=0), at_risk[0]
+        )
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chi2 = o_e**2 / var
+        log_hr = -o_e / var
+        se = 1 / np.sqrt(var)
+    z = stats.norm.ppf(0.975)
+    return {
+        "logrank_chi2": float(chi2),
+        "logrank_p": float(stats.chi2.sf(chi2, 1)),
+        "hr": float(np.exp(log_hr)),
+        "hr_ci": [float(np.exp(log_hr - z * se)), float(np.exp(log_hr + z * se))],
+    }
+
+
+def curve_points(
+    km: Dict[str, np.ndarray], points: int = KM_CURVE_POINTS
+) -> Dict[str, Any]:
+    """Step curves evaluated on at most ``points`` times, for reporting."""
+    times = km["times"]
+    if len(times) > points:
+        grid = np.quantile(times, np.linspace(0, 1, points))
+        idx = np.searchsorted(times, grid, side="right") - 1
+    else:
+        grid, idx = times, np.arange(len(times))
+    return {"time": grid.tolist(), "survival": km["survival"][:, idx].tolist()}
+
+
+def summarize(tables: Dict[str, np.ndarray], alpha: float = 0.05) -> Dict[str, Any]:
+    """Medians with CIs, log-rank test, HR and curves for baseline (0) vs
+    proposed (1)."""
+    km = km_from_tables(tables, alpha)
+    med = median_times(km["times"], km["survival"])
+    # the lower band crosses 0.5 first, so it bounds the median from below
+    med_low = median_times(km["times"], km["lower"])
+    med_high = median_times(km["times"], km["upper"])
+    curves = curve_points(km)
+    return {
+        "median_baseline": float(med[0]),
+        "median_proposed": float(med[1]),
+        "median_ci_baseline": [float(med_low[0]), float(med_high[0])],
+        "median_ci_proposed": [float(med_low[1]), float(med_high[1])],
+        **logrank(tables),
+        "km": {
+            "time": curves["time"],
+            "baseline": curves["survival"][0],
+            "proposed": curves["survival"][1],
+        },
+    }
+
+
+def km_summary(time_a, event_a, time_b, event_b) -> Dict[str, Any]:
+    time = np.concatenate(
+        [np.asarray(time_a, dtype=float), np.asarray(time_b, dtype=float)]
+    )
+    event = np.concatenate(
+        [np.asarray(event_a, dtype=float), np.asarray(event_b, dtype=float)]
+    )
+    masks = np.zeros((2, len(time)), dtype=bool)
+    masks[0, : len(time_a)] = True
+    masks[1, len(time_a) :] = True
+    return summarize(event_tables(time, event, masks))
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .datasets import CACHE, cohort_filters, load_frame, plan_columns
+from .executor import bin_from_moments, cont_from_moments
+from .filters import compile_filter
+from .power import power_chi2, power_normal
+from .schemas import DataDict, PlanModel, SweepSpec
+from .types import EndpointType, FilterOp
+
+_SUFFIX_OPS = {FilterOp.ge: "left", FilterOp.gt: "right"}
+_PREFIX_OPS = {FilterOp.lt: "left", FilterOp.le: "right"}
+
+
+def _split(filt: Dict[str, Any], spec: SweepSpec) -> Dict[str, Any]:
+    """Remove the swept predicate from a cohort filter and return the rest."""
+
+    def is_target(f: Dict[str, Any]) -> bool:
+        return f.get("col") == spec.col and f.get("op") == spec.op
+
+    if is_target(filt):
+        return {"and": []}
+    children = filt.get("and", [])
+    rest = [f for f in children if not is_target(f)]
+    if len(rest) != len(children) - 1:
+        raise ValueError(
+            f"cohort {spec.cohort} needs exactly one top-level "
+            f"'{spec.col} {spec.op.value}' predicate"
+        )
+    return {"and": rest}
+
+
+def _cumulative(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Sort by ``x`` and return prefix sums of rows, non-null y, y and y**2."""
+    order = np.argsort(x, kind="stable")
+    xs, ys = x[order], y[order]
+    valid = ~np.isnan(ys)
+    # shift by the mean so sums of squares do not lose precision
+    shift = ys[valid].mean() if valid.any() else 0.0
+    centred = np.where(valid, ys - shift, 0.0)
+    zero = np.zeros(1)
+    rows = np.arange(len(xs) + 1, dtype=float)
+    count = np.concatenate([zero, np.cumsum(valid)])
+    total = np.concatenate([zero, np.cumsum(centred)])
+    squares = np.concatenate([zero, np.cumsum(centred**2)])
+    return xs, shift, rows, count, total, squares
+
+
+def _finite(value: Any) -> Optional[float]:
+    """JSON-safe float: NaN and infinities (too few rows) become ``None``."""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def sweep(plan: PlanModel, dct: DataDict, spec: SweepSpec) -> Dict[str, Any]:
+    """Evaluate ``spec.values`` as thresholds of one predicate in a single sorted
+    pass."""
+    endpoint = plan.endpoint
+    if endpoint.type == EndpointType.time_to_event:
+        raise ValueError("sweep supports continuous and binary endpoints")
+    if spec.op not in _SUFFIX_OPS and spec.op not in _PREFIX_OPS:
+        raise ValueError("sweep supports <, <=, > and >= predicates")
+    filters = cohort_filters(plan)
+    if spec.cohort not in filters or spec.cohort == "baseline":
+        raise ValueError(f"cannot sweep cohort {spec.cohort}")
+
+    df = load_frame(dct, plan_columns(plan))
+    version = CACHE.version(df)
+    y_all = df[endpoint.value].to_numpy(dtype=float)
+    base = y_all[compile_filter(filters["baseline"]).mask(df, version=version)]
+    base = pd.Series(base)
+
+    rest = compile_filter(_split(filters[spec.cohort], spec)).mask(df, version=version)
+    x = df[spec.col].to_numpy(dtype=float)[rest]
+    y = y_all[rest]
+    keep = ~np.isnan(x)  # NaN never satisfies a comparison
+    xs, shift, rows, count, total, squares = _cumulative(x[keep], y[keep])
+
+    values = np.asarray(spec.values, dtype=float)
+    if spec.op in _SUFFIX_OPS:
+        idx = np.searchsorted(xs, values, side=_SUFFIX_OPS[spec.op])
+        n, c, s, ss = (arr[-1] - arr[idx] for arr in (rows, count, total, squares))
+    else:
+        idx = np.searchsorted(xs, values, side=_PREFIX_OPS[spec.op])
+        n, c, s, ss = (arr[idx] for arr in (rows, count, total, squares))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s / c + shift
+        var = (ss - s**2 / c) / (c - 1)
+
+    power = plan.analysis.power
+    if endpoint.type == EndpointType.continuous:
+        res = cont_from_moments(
+            len(base), base.mean(), base.std(ddof=1), n, mean, np.sqrt(var)
+        )
+        effect = power.effect_assumed or res["delta"]
+        pwr = power_normal(effect, res["sp"], power.n_per_arm, power.alpha)
+        keys = ["mean_baseline", "mean_proposed", "delta", "sp"]
+    else:
+        res = bin_from_moments(len(base), base.mean(), n, mean)
+        pwr = power_chi2(
+            power.p1_assumed or res["p1"],
+            power.p2_assumed or res["p2"],
+            power.n_per_arm,
+            power.alpha,
+        )
+        keys = ["p1", "p2", "delta"]
+
+    grid: List[Dict[str, Any]] = []
+    for i, value in enumerate(spec.values):
+        point = {
+            key: _finite(np.broadcast_to(res[key], values.shape)[i]) for key in keys
+        }
+        point["ci"] = [_finite(res["ci"][0][i]), _finite(res["ci"][1][i])]
+        grid.append(
+            {
+                "value": value,
+                "n_proposed": int(n[i]),
+                "stats": point,
+                "power": _finite(np.broadcast_to(pwr, values.shape)[i]),
+            }
+        )
+    return {
+        "cohort": spec.cohort,
+        "col": spec.col,
+        "op": spec.op.value,
+        "n_baseline": len(base),
+        "grid": grid,
+    }
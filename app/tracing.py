@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .settings import TRACING
+
+BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+_STAGES: ContextVar[Optional[Dict[str, float]]] = ContextVar("stages", default=None)
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    """Stage histograms plus gauges collected from registered callbacks at scrape
+    time."""
+
+    def __init__(self) -> None:
+        self._stages: Dict[str, Histogram] = {}
+        self._gauges: List[
+            Callable[[], Dict[str, Dict[Tuple[Tuple[str, str], ...], float]]]
+        ] = []
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = Histogram()
+            hist.observe(seconds)
+
+    def register(
+        self, collect: Callable[[], Dict[str, Dict[Tuple[Tuple[str, str], ...], float]]]
+    ) -> None:
+        """``collect()`` returns ``{metric: {labels: value}}`` with labels as
+        ``((name, value), ...)``."""
+        self._gauges.append(collect)
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = ["# TYPE agentic_stage_seconds histogram"]
+        with self._lock:
+            for stage in sorted(self._stages):
+                hist = self._stages[stage]
+                bucket = f'agentic_stage_seconds_bucket{{stage="{stage}"'
+                running = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    running += count
+                    lines.append(f'{bucket},le="{bound}"}} {running}')
+                lines.append(f'{bucket},le="+Inf"}} {hist.count}')
+                lines.append(
+                    f'agentic_stage_seconds_sum{{stage="{stage}"}} {hist.total}'
+                )
+                lines.append(
+                    f'agentic_stage_seconds_count{{stage="{stage}"}} {hist.count}'
+                )
+        gauges: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        for collect in self._gauges:
+            for name, series in collect().items():
+                gauges.setdefault(name, {}).update(series)
+        for name in sorted(gauges):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in gauges[name].items():
+                text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{text}}} {value}" if text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def cache_gauges(
+    cache: str, hits: int, misses: int, nbytes: Optional[int] = None
+) -> Dict[str, Dict[Tuple[Tuple[str, str], ...], float]]:
+    """Hit/miss counts, hit ratio and optionally size of one cache, for
+    :meth:`Metrics.register`."""
+    labels = (("cache", cache),)
+    out = {
+        "agentic_cache_hits": {labels: hits},
+        "agentic_cache_misses": {labels: misses},
+        "agentic_cache_hit_ratio": {
+            labels: hits / (hits + misses) if hits + misses else 0.0
+        },
+    }
+    if nbytes is not None:
+        out["agentic_cache_bytes"] = {labels: nbytes}
+    return out
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        elapsed = time.perf_counter() - self.start
+        METRICS.observe(self.name, elapsed)
+        stages = _STAGES.get()
+        if stages is not None:
+            stages[self.name] = stages.get(self.name, 0.0) + elapsed
+
+
+def span(name: str):
+    """Time a stage into :data:`METRICS` and the current trace; a shared no-op
+    when tracing is off."""
+    return _Span(name) if TRACING else _NOOP
+
+
+@contextmanager
+def trace(stages: Optional[Dict[str, float]] = None) -> Iterator[Dict[str, float]]:
+    """Collect the durations of spans closed in this context (and thread) into
+    ``stages``."""
+    stages = {} if stages is None else stages
+    token = _STAGES.set(stages)
+    try:
+        yield stages
+    finally:
+        _STAGES.reset(token)
+
+
+def current_stages() -> Dict[str, float]:
+    return dict(_STAGES.get() or {})
@@ -0,0 +1,239 @@
+"""Benchmark suite: filters, execute per endpoint, fairness, finalize and /run.
+
+Generates (or reuses) a synthetic dataset under ``data/bench`` and prints one
+JSON document with throughput, p50/p99 latency and peak traced allocation per
+benchmark, for comparing commits.
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+from app.datasets import CACHE, load_plan_frame  # noqa: E402
+from app.executor import analyze, finalize  # noqa: E402
+from app.fairness import subgroup_tables  # noqa: E402
+from app.filters import MASKS, compile_filter  # noqa: E402
+from app.planner import DEFAULT_PLAN  # noqa: E402
+from app.validator import load_datadict, load_plan  # noqa: E402
+from scripts.make_synth_data import generate  # noqa: E402
+
+BENCH_URI = "local://data/bench/"
+ENDPOINTS = {
+    "continuous": {"type": "continuous", "value": "endpoint_value"},
+    "binary": {"type": "binary", "value": "event_flag"},
+    "time_to_event": {
+        "type": "time_to_event",
+        "value": {"time": "event_time", "event": "event_flag"},
+    },
+}
+
+
+def peak_alloc_mb(
+    fn: Callable[[], Any], setup: Callable[[], Any] | None = None
+) -> float:
+    """Peak memory allocated during one untimed call of ``fn``, traced with
+    tracemalloc (NumPy and Python objects; Arrow's own memory pool is not traced)."""
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def measure(
+    name: str,
+    fn: Callable[[], Any],
+    repeat: int,
+    rows: int,
+    setup: Callable[[], Any] | None = None,
+) -> Dict[str, Any]:
+    """Latency over ``repeat`` timed calls, then one traced call for memory, so
+    tracing never slows the timings and each benchmark reports its own peak."""
+    times: List[float] = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    p50, p99 = np.percentile(times, [50, 99])
+    return {
+        "name": name,
+        "repeat": repeat,
+        "p50_ms": float(p50 * 1e3),
+        "p99_ms": float(p99 * 1e3),
+        "rows_per_s": float(rows / p50) if p50 else None,
+        "peak_alloc_mb": peak_alloc_mb(fn, setup),
+    }
+
+
+def bench_plan(endpoint: Dict[str, Any], cardinality: int) -> Dict[str, Any]:
+    plan = copy.deepcopy(DEFAULT_PLAN)
+    plan["dataset"] = {
+        "uri": BENCH_URI + "data.parquet",
+        "dict": BENCH_URI + "data_dict.yaml",
+    }
+    plan["cohorts"] = {
+        "baseline": {
+            "and": [
+                {"col": "score", "op": ">=", "val": 26},
+                {"col": "age", "op": ">=", "val": 60},
+            ]
+        },
+        "proposed": {
+            "and": [
+                {"col": "score", "op": ">=", "val": 24},
+                {"col": "sex", "op": "in", "val": ["F", "M"]},
+            ]
+        },
+    }
+    plan["endpoint"] = endpoint
+    plan["policy"] = {"autotune": {"enable": False, "steps": []}}
+    if cardinality:
+        plan["fairness"] = {
+            "subgroups": ["sex", "age_band", "site"],
+            "intersections": ["sex*site"],
+        }
+    return plan
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    out = ROOT / "data" / "bench"
+    dct_path = out / "data_dict.yaml"
+    started = time.perf_counter()
+    if args.regenerate or not dct_path.exists():
+        generate(
+            out,
+            args.rows,
+            args.width,
+            args.cardinality,
+            args.files,
+            args.chunk_rows,
+            args.seed,
+            BENCH_URI,
+        )
+    gen_s = time.perf_counter() - started
+    dct = load_datadict(dct_path)
+    rows = args.rows
+    results: List[Dict[str, Any]] = []
+
+    def cold() -> None:
+        CACHE.clear()
+        MASKS.clear()
+
+    plan = load_plan(bench_plan(ENDPOINTS["continuous"], args.cardinality))
+    results.append(
+        measure(
+            "load", lambda: load_plan_frame(plan, dct), args.repeat, rows, setup=cold
+        )
+    )
+    df = load_plan_frame(plan, dct)
+    compiled = compile_filter(
+        plan.cohorts["proposed"].model_dump(by_alias=True, exclude_none=True)
+    )
+    results.append(
+        measure("filters.evaluate", lambda: compiled.mask(df), args.repeat, len(df))
+    )
+
+    for name, endpoint in ENDPOINTS.items():
+        raw = bench_plan(endpoint, args.cardinality)
+        frame = load_plan_frame(load_plan(raw), dct)
+        results.append(
+            measure(
+                f"execute.{name}",
+                lambda: analyze(load_plan(copy.deepcopy(raw)), dct, frame),
+                args.repeat,
+                len(frame),
+                setup=MASKS.clear,
+            )
+        )
+
+    masks = np.stack(
+        [
+            compile_filter(f.model_dump(by_alias=True, exclude_none=True)).mask(df)
+            for f in plan.cohorts.values()
+        ]
+    )
+    subs = plan.fairness.get("subgroups", [])
+    inter = plan.fairness.get("intersections", [])
+    results.append(
+        measure(
+            "fairness",
+            lambda: subgroup_tables(df, masks, subs, 10, None, inter),
+            args.repeat,
+            len(df),
+        )
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results.append(
+            measure(
+                "finalize",
+                lambda: finalize(plan, dct, Path(tmp), {}, 0),
+                args.repeat,
+                rows,
+            )
+        )
+
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    client = TestClient(app)
+    body = {"plan_json": bench_plan(ENDPOINTS["continuous"], args.cardinality)}
+
+    def post() -> None:
+        resp = client.post(
+            "/run", json=body, headers={"Idempotency-Key": uuid.uuid4().hex}
+        )
+        resp.raise_for_status()
+
+    results.append(measure("run", post, args.repeat, rows))
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "rows": rows,
+        "width": args.width,
+        "cardinality": args.cardinality,
+        "files": args.files,
+        "generate_s": gen_s,
+        "benchmarks": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--cardinality", type=int, default=50)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--regenerate", action="store_true", help="rewrite data/bench even if it exists"
+    )
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
@@ -0,0 +1,99 @@
+"""Micro-benchmark: compiled filters vs. the previous concat-based evaluator."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import operator
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from app.filters import compile_filter  # noqa: E402
+
+_OPS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+def legacy_evaluate(df: pd.DataFrame, filt: Dict[str, Any]) -> pd.Series:
+    if "and" in filt:
+        return pd.concat([legacy_evaluate(df, f) for f in filt["and"]], axis=1).all(
+            axis=1
+        )
+    if "or" in filt:
+        return pd.concat([legacy_evaluate(df, f) for f in filt["or"]], axis=1).any(
+            axis=1
+        )
+    if "not" in filt:
+        return ~legacy_evaluate(df, filt["not"])
+    series, op, val = df[filt["col"]], filt["op"], filt["val"]
+    if op in _OPS:
+        return _OPS[op](series, val)
+    if op == "in":
+        return series.isin(val)
+    if op == "not_in":
+        return ~series.isin(val)
+    low, high = val
+    return series.between(low, high)
+
+
+def make_frame(rows: int, width: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    cols = {f"x{i}": rng.normal(0, 1, rows) for i in range(width)}
+    cols["group"] = rng.choice(["a", "b", "c", "d"], size=rows)
+    return pd.DataFrame(cols)
+
+
+def wide_tree(width: int) -> Dict[str, Any]:
+    preds = [{"col": f"x{i}", "op": ">=", "val": -2.5} for i in range(width)]
+    return {"and": preds + [{"col": "group", "op": "in", "val": ["a", "b", "c"]}]}
+
+
+def deep_tree(depth: int) -> Dict[str, Any]:
+    filt: Dict[str, Any] = {"col": "x0", "op": "between", "val": [-1, 1]}
+    for i in range(depth):
+        leaf = {"col": f"x{i % 4}", "op": "<" if i % 2 else ">", "val": 0.0}
+        filt = {"or": [filt, leaf]} if i % 2 else {"and": [{"not": filt}, leaf]}
+    return filt
+
+
+def _timeit(fn: Callable[[], Any], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def run(rows: int, width: int, depth: int, repeat: int) -> Dict[str, Any]:
+    df = make_frame(rows, max(width, 4))
+    out: Dict[str, Any] = {"rows": rows}
+    for name, filt in (("wide", wide_tree(width)), ("deep", deep_tree(depth))):
+        compiled = compile_filter(filt)
+        assert np.array_equal(compiled.mask(df), legacy_evaluate(df, filt).to_numpy())
+        legacy = _timeit(lambda: legacy_evaluate(df, filt), repeat)
+        fast = _timeit(lambda: compiled.mask(df), repeat)
+        out[name] = {"legacy_s": legacy, "compiled_s": fast, "speedup": legacy / fast}
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--width", type=int, default=32)
+    parser.add_argument("--depth", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.width, args.depth, args.repeat), indent=2))
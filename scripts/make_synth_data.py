@@ -1,19 +1,31 @@
+"""Synthetic demo dataset; with --rows, a scalable dataset for benchmarks."""
+
 from __future__ import annotations
 
+import argparse
 from pathlib import Path
+from typing import Any, Dict, List
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import yaml
 
 ROOT = Path(__file__).resolve().parents[1]
 DATA = ROOT / "data"
 
 
-def main() -> None:
-    rng = np.random.default_rng(0)
-    n = 600
-    ids = np.arange(n)
+def make_frame(
+    rng: np.random.Generator,
+    n: int,
+    start: int = 0,
+    width: int = 0,
+    cardinality: int = 0,
+) -> pd.DataFrame:
+    """``n`` synthetic rows; ``width`` extra float columns and a ``site`` subgroup
+    with ``cardinality`` levels are added after the demo columns."""
+    ids = np.arange(start, start + n)
     age = rng.integers(50, 85, n)
     score = rng.normal(25, 5, n)
     sex = rng.choice(["F", "M"], size=n)
@@ -33,24 +45,117 @@ def main() -> None:
             "event_flag": event_flag,
         }
     )
-    DATA.mkdir(exist_ok=True)
-    df.to_parquet(DATA / "data.parquet")
-    data_dict = {
+    for i in range(width):
+        df[f"x{i}"] = rng.normal(0, 1, n)
+    if cardinality:
+        df["site"] = np.char.add("s", rng.integers(0, cardinality, n).astype(str))
+    return df
+
+
+def data_dict(files: List[str], width: int = 0, cardinality: int = 0) -> Dict[str, Any]:
+    columns: Dict[str, Any] = {
+        "id": {"role": "id"},
+        "age": {"role": "cohort_field", "type": "int"},
+        "score": {"role": "cohort_field", "type": "float"},
+        "sex": {"role": "subgroup_field", "categories": ["F", "M"]},
+        "age_band": {"role": "subgroup_field", "categories": ["<65", "65-74", "75+"]},
+        "endpoint_value": {"role": "endpoint", "endpoint_type": "continuous"},
+        "event_time": {"role": "endpoint", "endpoint_type": "time_to_event"},
+        "event_flag": {"role": "endpoint_flag"},
+    }
+    for i in range(width):
+        columns[f"x{i}"] = {"role": "cohort_field", "type": "float"}
+    if cardinality:
+        columns["site"] = {
+            "role": "subgroup_field",
+            "categories": [f"s{i}" for i in range(cardinality)],
+        }
+    return {
         "dataset_id": "ds_demo",
-        "files": [{"path": str(DATA / "data.parquet")}],
-        "columns": {
-            "id": {"role": "id"},
-            "age": {"role": "cohort_field", "type": "int"},
-            "score": {"role": "cohort_field", "type": "float"},
-            "sex": {"role": "subgroup_field", "categories": ["F", "M"]},
-            "age_band": {"role": "subgroup_field", "categories": ["<65", "65-74", "75+"]},
-            "endpoint_value": {"role": "endpoint", "endpoint_type": "continuous"},
-            "event_time": {"role": "endpoint", "endpoint_type": "time_to_event"},
-            "event_flag": {"role": "endpoint_flag"},
-        },
+        "files": [{"path": f} for f in files],
+        "columns": columns,
     }
-    (DATA / "data_dict.yaml").write_text(yaml.safe_dump(data_dict))
+
+
+def generate(
+    out: Path,
+    rows: int,
+    width: int = 0,
+    cardinality: int = 0,
+    files: int = 1,
+    chunk_rows: int = 1_000_000,
+    seed: int = 0,
+    uri_prefix: str | None = None,
+) -> Path:
+    """Write ``rows`` rows over ``files`` parquet files a chunk at a time, so
+    memory stays at ``chunk_rows`` rows however large the dataset; returns the
+    data dictionary path. With ``uri_prefix`` (e.g. ``local://data/bench/``)
+    the dictionary lists files by URI instead of absolute path.
+
+    Rows are drawn chunk by chunk from one generator, so the data depends on
+    ``chunk_rows`` (and ``files``) as well as ``seed``; keep them fixed to
+    reproduce a dataset."""
+    rng = np.random.default_rng(seed)
+    out.mkdir(parents=True, exist_ok=True)
+    bounds = np.linspace(0, rows, files + 1).astype(np.int64)
+    names = (
+        [f"part-{i:05d}.parquet" for i in range(files)]
+        if files > 1
+        else ["data.parquet"]
+    )
+    for name, lo, hi in zip(names, bounds[:-1], bounds[1:]):
+        writer = None
+        for start in range(lo, hi, chunk_rows):
+            table = pa.Table.from_pandas(
+                make_frame(rng, min(chunk_rows, hi - start), start, width, cardinality),
+                preserve_index=False,
+            )
+            writer = writer or pq.ParquetWriter(out / name, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+    listed = [uri_prefix + name if uri_prefix else str(out / name) for name in names]
+    path = out / "data_dict.yaml"
+    path.write_text(yaml.safe_dump(data_dict(listed, width, cardinality)))
+    return path
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    df = make_frame(rng, 600)
+    DATA.mkdir(exist_ok=True)
+    df.to_parquet(DATA / "data.parquet")
+    (DATA / "data_dict.yaml").write_text(
+        yaml.safe_dump(data_dict([str(DATA / "data.parquet")]))
+    )
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=0,
+        help="rows to generate (default: the 600-row demo dataset)",
+    )
+    parser.add_argument("--width", type=int, default=0, help="extra float columns")
+    parser.add_argument(
+        "--cardinality", type=int, default=0, help="levels of the extra 'site' subgroup"
+    )
+    parser.add_argument("--files", type=int, default=1)
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=DATA)
+    args = parser.parse_args()
+    if args.rows:
+        generate(
+            args.out,
+            args.rows,
+            args.width,
+            args.cardinality,
+            args.files,
+            args.chunk_rows,
+            args.seed,
+        )
+    else:
+        main()
@@ -0,0 +1,92 @@
+"""Startup profile: import cost of ``app.main`` and first-request latency per
+endpoint in a fresh interpreter, printed as JSON."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY = ("pandas", "numpy", "scipy", "pyarrow", "jinja2")
+
+_FIRST_REQUESTS = """
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+from fastapi.testclient import TestClient
+out = {"import_s": time.perf_counter() - t0}
+out["loaded_at_import"] = [m for m in %r if m in sys.modules]
+client = TestClient(app.main.app, raise_server_exceptions=False)
+plan = client.post("/plan", json={}).json()["plan_json"]
+def run():
+    headers = {"Idempotency-Key": str(time.time())}
+    return client.post("/run", json={"plan_json": plan}, headers=headers)
+for name, call in (
+    ("healthz", lambda: client.get("/healthz")),
+    ("plan", lambda: client.post("/plan", json={})),
+    ("run", run),
+    ("run_warm", run),
+):
+    start = time.perf_counter()
+    status = call().status_code
+    out[name] = {"status": status, "seconds": time.perf_counter() - start}
+print(json.dumps(out))
+"""
+
+
+def import_profile(top: int) -> Dict[str, Any]:
+    """Parse ``python -X importtime`` output for ``app.main``."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows: List[Dict[str, Any]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (
+            part.strip() for part in line.replace("import time:", "|", 1).split("|")
+        )
+        rows.append(
+            {
+                "module": name,
+                "self_ms": int(self_us) / 1e3,
+                "cumulative_ms": int(cumulative_us) / 1e3,
+            }
+        )
+    total = next((r["cumulative_ms"] for r in rows if r["module"] == "app.main"), None)
+    rows.sort(key=lambda r: r["self_ms"], reverse=True)
+    return {"app_main_ms": total, "modules": len(rows), "top_self": rows[:top]}
+
+
+def first_requests() -> Dict[str, Any]:
+    proc = subprocess.run(
+        [sys.executable, "-c", _FIRST_REQUESTS % (HEAVY,)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--no-requests",
+        action="store_true",
+        help="skip first-request timings (needs data/)",
+    )
+    args = parser.parse_args()
+    report: Dict[str, Any] = {"imports": import_profile(args.top)}
+    if not args.no_requests:
+        report["first_requests"] = first_requests()
+    print(json.dumps(report, indent=2))
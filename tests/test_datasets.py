@@ -0,0 +1,269 @@
+import os
+
+import pandas as pd
+
+from app.datasets import DatasetCache, dataset_key
+from app.schemas import DataDict
+
+
+def test_cache_hit_and_invalidation(tmp_path):
+    path = tmp_path / "data.parquet"
+    pd.DataFrame({"a": [1, 2, 3]}).to_parquet(path)
+    dct = DataDict(dataset_id="t", files=[{"path": str(path)}], columns={})
+    cache = DatasetCache(1 << 20)
+    first = cache.get(dataset_key(path, dct), lambda: pd.read_parquet(path))
+    assert cache.get(dataset_key(path, dct), lambda: pd.read_parquet(path)) is first
+    pd.DataFrame({"a": [4, 5]}).to_parquet(path)
+    os.utime(path, ns=(1, 1))
+    second = cache.get(dataset_key(path, dct), lambda: pd.read_parquet(path))
+    assert second["a"].tolist() == [4, 5]
+    assert cache.stats()["entries"] == 1
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_evicts_lru():
+    frame = pd.DataFrame({"a": range(100)})
+    size = int(frame.memory_usage(deep=True).sum())
+    cache = DatasetCache(size * 2)
+    for name in ["x", "y", "z"]:
+        cache.get((name,), lambda: frame.copy())
+    assert cache.stats()["entries"] == 2
+    assert cache.evictions == 1
+
+
+def test_plan_projection_and_pushdown():
+    from app.datasets import plan_columns, plan_pushdown
+    from app.planner import DEFAULT_PLAN
+    from app.validator import load_plan
+
+    plan = load_plan(
+        {
+            **DEFAULT_PLAN,
+            "cohorts": {
+                "baseline": {
+                    "and": [
+                        {"col": "score", "op": ">=", "val": 26},
+                        {"not": {"col": "sex", "op": "==", "val": "F"}},
+                    ]
+                },
+                "proposed": {"and": [{"col": "score", "op": ">=", "val": 24}]},
+            },
+        }
+    )
+    assert plan_columns(plan) == ["age_band", "endpoint_value", "score", "sex"]
+    assert str(plan_pushdown(plan)) == "((score >= 26) or (score >= 24))"
+
+
+def test_partitioned_directory_is_one_dataset(tmp_path):
+    import numpy as np
+
+    from app.datasets import (
+        load_plan_frame,
+        open_dataset,
+        plan_pushdown,
+        read_fragments,
+    )
+    from app.executor import analyze
+    from app.planner import DEFAULT_PLAN
+    from app.streaming import analyze_streaming
+    from app.validator import load_plan
+
+    rng = np.random.default_rng(0)
+    parts = []
+    for site in ["a", "b", "c"]:
+        part = pd.DataFrame(
+            {
+                "age": rng.integers(40, 90, 200),
+                "sex": rng.choice(["F", "M"], 200),
+                "y": rng.normal(0, 1, 200),
+            }
+        )
+        (tmp_path / f"site={site}").mkdir()
+        part.to_parquet(tmp_path / f"site={site}" / "part-0.parquet")
+        parts.append(part.assign(site=site))
+    dct = DataDict(dataset_id="t", files=[{"path": str(tmp_path)}], columns={})
+    raw = {
+        **DEFAULT_PLAN,
+        "cohorts": {
+            "baseline": {"and": [{"col": "site", "op": "==", "val": "a"}]},
+            "proposed": {
+                "and": [
+                    {"col": "site", "op": "in", "val": ["a", "b"]},
+                    {"col": "age", "op": ">=", "val": 60},
+                ]
+            },
+        },
+        "endpoint": {"type": "continuous", "value": "y"},
+        "fairness": {"subgroups": ["sex"]},
+    }
+    plan = load_plan(raw)
+    assert len(read_fragments(open_dataset(dct), plan_pushdown(plan))) == 2
+    df = load_plan_frame(plan, dct)
+    full = pd.concat(parts, ignore_index=True)
+    assert set(df.site) == {"a", "b"}
+    expected, _ = analyze(plan, dct, df)
+    got, _ = analyze_streaming(load_plan(raw), dct, batch_rows=64)
+    assert (got["n_baseline"], got["n_proposed"]) == (
+        200,
+        int(((full.site != "c") & (full.age >= 60)).sum()),
+    )
+    assert (got["n_baseline"], got["n_proposed"]) == (
+        expected["n_baseline"],
+        expected["n_proposed"],
+    )
+    assert np.isclose(got["stats"]["delta"], expected["stats"]["delta"])
+    assert got["fairness"] == expected["fairness"]
+
+
+def test_threshold_study_shares_one_cached_frame(tmp_path):
+    import numpy as np
+
+    from app.datasets import CACHE, load_plan_frame
+    from app.planner import DEFAULT_PLAN
+    from app.streaming import analyze_streaming
+    from app.validator import load_plan
+
+    path = tmp_path / "data.parquet"
+    pd.DataFrame(
+        {
+            "score": np.arange(100.0),
+            "sex": ["F", "M"] * 50,
+            "age_band": "<65",
+            "endpoint_value": np.sin(np.arange(100.0)),
+        }
+    ).to_parquet(path)
+    dct = DataDict(dataset_id="t", files=[{"path": str(path)}], columns={})
+
+    def plan(threshold):
+        cohorts = {
+            "baseline": {"col": "score", "op": ">=", "val": 90},
+            "proposed": {"col": "score", "op": ">=", "val": threshold},
+        }
+        return load_plan({**DEFAULT_PLAN, "cohorts": cohorts})
+
+    first = load_plan_frame(plan(80), dct)
+    assert len(first) == 20
+    shared = load_plan_frame(plan(60), dct)
+    assert len(shared) == 100
+    hits = CACHE.hits
+    assert (
+        load_plan_frame(plan(40), dct) is shared
+        and load_plan_frame(plan(80), dct) is not None
+    )
+    assert CACHE.hits == hits + 2 and CACHE.version(shared) is not None
+
+    # ``score == "x"`` has no Arrow kernel; it is evaluated in pandas instead
+    proposed = {
+        "or": [
+            {"col": "score", "op": "==", "val": "x"},
+            {"col": "score", "op": "<", "val": 10},
+        ]
+    }
+    mismatched = load_plan(
+        {
+            **DEFAULT_PLAN,
+            "cohorts": {
+                "baseline": {"col": "score", "op": ">=", "val": 90},
+                "proposed": proposed,
+            },
+        }
+    )
+    CACHE.clear()
+    assert len(load_plan_frame(mismatched, dct)) == 100
+    assert analyze_streaming(mismatched, dct)[0]["n_proposed"] == 10
+
+
+def test_ipc_frames_are_mapped_views(tmp_path, monkeypatch):
+    import numpy as np
+
+    from app import datasets
+
+    monkeypatch.setattr(datasets, "IPC_DIR", tmp_path / "ipc")
+    monkeypatch.setattr(datasets, "ARROW_IPC", True)
+    path = tmp_path / "data.parquet"
+    source = pd.DataFrame(
+        {
+            "y": np.arange(1000, dtype=float),
+            "sex": np.where(np.arange(1000) % 2, "F", "M"),
+        }
+    )
+    source.to_parquet(path)
+    dct = DataDict(dataset_id="t", files=[{"path": str(path)}], columns={})
+    df = datasets.load_frame(dct, ["sex", "y"])
+    assert isinstance(df["sex"].dtype, pd.CategoricalDtype)
+    assert not df["y"].to_numpy().flags.owndata
+    assert df["sex"].astype(str).tolist() == source["sex"].tolist()
+    first = datasets.ipc_path(dct)
+    source.head(10).to_parquet(path)
+    os.utime(path, ns=(1, 1))
+    assert len(datasets.load_frame(dct, ["y"])) == 10
+    assert not first.exists() and len(list((tmp_path / "ipc").glob("*.arrow"))) == 1
+
+
+def test_dictionary_dtypes_and_categorical_filters():
+    import numpy as np
+
+    from app.datasets import apply_dtypes
+    from app.filters import compile_filter
+
+    raw = pd.DataFrame(
+        {
+            "age": np.arange(100, dtype=np.int64),
+            "sex": np.array(["F", "M", None, "M"] * 25, dtype=object),
+            "flag": np.tile([0, 1], 50),
+            "score": np.linspace(0, 1, 100),
+        }
+    )
+    dct = DataDict(
+        dataset_id="t",
+        files=[],
+        columns={
+            "age": {"role": "cohort_field", "type": "int"},
+            "sex": {"role": "subgroup_field", "categories": ["M", "F"]},
+            "flag": {"role": "endpoint_flag"},
+            "score": {"role": "cohort_field", "type": "float32"},
+        },
+    )
+    df = apply_dtypes(raw.copy(), dct)
+    assert [str(t) for t in df.dtypes] == ["int8", "category", "bool", "float32"]
+    assert list(df["sex"].cat.categories) == ["M", "F"]
+    assert df.memory_usage(deep=True).sum() < raw.memory_usage(deep=True).sum() / 4
+    for filt in (
+        {"col": "sex", "op": "==", "val": "F"},
+        {"col": "sex", "op": "!=", "val": "F"},
+        {"col": "sex", "op": "in", "val": ["M"]},
+        {"col": "sex", "op": ">", "val": "F"},
+    ):
+        assert (compile_filter(filt).mask(df) == compile_filter(filt).mask(raw)).all()
+    extra = apply_dtypes(
+        raw.assign(sex=np.where(raw["sex"] == "F", "X", raw["sex"])), dct
+    )
+    assert list(extra["sex"].cat.categories) == ["M", "F", "X"]
+    assert extra["sex"].isna().sum() == raw["sex"].isna().sum()
+
+
+def test_generator_writes_chunked_multi_file_dataset(tmp_path):
+    from app.datasets import load_frame
+    from app.validator import load_datadict
+    from scripts.make_synth_data import generate
+
+    dct = load_datadict(
+        generate(tmp_path, 1000, width=2, cardinality=3, files=2, chunk_rows=300)
+    )
+    df = load_frame(dct)
+    assert len(df) == 1000 and len(dct.files) == 2
+    assert df["id"].tolist() == list(range(1000))
+    assert set(df["site"].cat.categories) == {"s0", "s1", "s2"} and {"x0", "x1"} <= set(
+        df.columns
+    )
+
+
+def test_versions_belong_to_live_entries():
+    frame = pd.DataFrame({"a": range(100)})
+    size = int(frame.memory_usage(deep=True).sum())
+    cache = DatasetCache(size)
+    first = cache.get(("x",), lambda: frame.copy())
+    version = cache.version(first)
+    assert version is not None and cache.version(first.copy()) is None
+    second = cache.get(("y",), lambda: frame.copy())
+    assert cache.version(first) is None and cache.version(second) not in (None, version)
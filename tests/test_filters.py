@@ -8,3 +8,59 @@ def test_and_or_not():
     filt = {"and": [{"col": "a", "op": ">", "val": 1}, {"not": {"col": "b", "op": "==", "val": 5}}]}
     mask = evaluate(df, filt)
     assert mask.tolist() == [False, False, True]
+
+
+def test_compiled_nested_and_empty():
+    import numpy as np
+    import pytest
+
+    from app.filters import CompiledFilter
+
+    df = pd.DataFrame({"a": [1, 2, 3, np.nan], "s": ["x", "y", None, "x"]})
+    filt = {
+        "or": [
+            {
+                "and": [
+                    {"col": "a", "op": ">", "val": 1},
+                    {"not": {"col": "s", "op": "in", "val": ["y"]}},
+                ]
+            },
+            {"col": "a", "op": "between", "val": [1, 1]},
+        ]
+    }
+    assert CompiledFilter(filt).mask(df).tolist() == [True, False, True, False]
+    assert evaluate(df, {"and": []}).all()
+    with pytest.raises(ValueError):
+        CompiledFilter({"col": "zz", "op": "==", "val": 1}, columns=df.columns)
+
+
+def test_mask_cache_shares_subtrees():
+    from app.filters import MaskCache, MASKS, compile_filter, filter_hash
+
+    a = {
+        "and": [
+            {"col": "a", "op": ">", "val": 1},
+            {"col": "b", "op": "in", "val": [6, 4]},
+        ]
+    }
+    b = {
+        "and": [
+            {"col": "b", "op": "in", "val": [4, 6]},
+            {"col": "a", "op": ">", "val": 1},
+        ]
+    }
+    assert filter_hash(a) == filter_hash(b)
+    df = pd.DataFrame({"a": [1, 2, 3], "b": [4, 5, 6]})
+    MASKS.clear()
+    first = compile_filter(a).mask(df, version="v1")
+    hits = MASKS.hits
+    assert (
+        compile_filter(b).mask(df, version="v1").tolist()
+        == first.tolist()
+        == [False, False, True]
+    )
+    assert MASKS.hits == hits + 1
+    cache = MaskCache(1 << 10)
+    cache.put(("v", "k"), first)
+    assert cache.get(("v", "k"), 3).tolist() == first.tolist()
+    assert cache.get(("v", "k"), 4) is None
@@ -34,3 +34,201 @@ def test_run_and_idempotent(tmp_path):
     run_id = resp.json()["run_id"]
     resp2 = client.post("/run", json={"plan_json": plan}, headers={"Idempotency-Key": "abc"})
     assert resp2.json()["run_id"] == run_id
+
+
+def test_run_batch_streams_ndjson():
+    plan = {
+        "question": "batch",
+        "dataset": {
+            "uri": "local://data/data.parquet",
+            "dict": "local://data/data_dict.yaml",
+        },
+        "cohorts": {
+            "baseline": {"and": [{"col": "score", "op": ">=", "val": 26}]},
+            "proposed": {"and": [{"col": "score", "op": ">=", "val": 24}]},
+        },
+        "endpoint": {"type": "binary", "value": "event_flag"},
+        "analysis": {
+            "stats": ["risk_diff"],
+            "power": {
+                "method": "normal_approx",
+                "alpha": 0.05,
+                "n_per_arm": 50,
+                "target": 0.8,
+            },
+        },
+        "fairness": {"subgroups": ["age_band"]},
+        "seed": 1,
+    }
+    other = {
+        **plan,
+        "cohorts": {
+            **plan["cohorts"],
+            "proposed": {"and": [{"col": "score", "op": ">=", "val": 22}]},
+        },
+    }
+    resp = client.post(
+        "/run/batch", json={"plans": [{"plan_json": plan}, {"plan_json": other}, {}]}
+    )
+    assert resp.status_code == 200
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    by_index = {line["index"]: line for line in lines}
+    assert "error" in by_index[2]
+    assert by_index[0]["run_id"] != by_index[1]["run_id"]
+
+    missing = {
+        **plan,
+        "dataset": {**plan["dataset"], "dict": "local://data/missing.yaml"},
+    }
+    resp = client.post(
+        "/run/batch",
+        json={
+            "plans": [
+                {"plan_json": missing},
+                {"plan_yaml": "a: [1"},
+                {"plan_json": plan},
+            ]
+        },
+    )
+    by_index = {line["index"]: line for line in map(json.loads, resp.text.splitlines())}
+    assert sorted(by_index) == [0, 1, 2]
+    assert "error" in by_index[0] and "error" in by_index[1] and "run_id" in by_index[2]
+
+
+def test_job_roundtrip():
+    import time
+
+    plan = client.post("/plan", json={}).json()["plan_json"]
+    plan["cohorts"] = {
+        "baseline": {"and": [{"col": "score", "op": ">=", "val": 26}]},
+        "proposed": {"and": [{"col": "score", "op": ">=", "val": 24}]},
+    }
+    resp = client.post("/jobs", json={"plan_json": plan})
+    assert resp.status_code == 202
+    job_id = resp.json()["job_id"]
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["state"] in ("done", "failed"):
+            break
+        time.sleep(0.2)
+    assert job["state"] == "done", job.get("error")
+    assert {"queued", "execute", "finalize", "render_submit"} <= set(job["stages"])
+    assert client.get("/jobs/missing").status_code == 404
+
+
+def test_jobs_are_claimed_once_and_recovered(tmp_path):
+    import os
+    import socket
+
+    from app.jobs import JobStore
+
+    store = JobStore(tmp_path / "jobs.sqlite")
+    for job_id in ("a", "b"):
+        store.create(job_id, {}, None)
+    me = f"{socket.gethostname()}:{os.getpid()}:x"
+    assert store.claim("a", me) and not store.claim("a", "other:1:y")
+    assert store.claim("b", f"{socket.gethostname()}:999999999:z")
+    assert store.requeue_abandoned(lease=3600) == 1
+    assert store.queued() == ["b"] and store.get("a")["owner"] == me
+
+
+def test_live_jobs_survive_an_expired_lease(tmp_path):
+    import os
+    import socket
+
+    from app.jobs import JobStore
+
+    store = JobStore(tmp_path / "jobs.sqlite")
+    for job_id in ("local", "remote"):
+        store.create(job_id, {}, None)
+    me = f"{socket.gethostname()}:{os.getpid()}:x"
+    assert store.claim("local", me) and store.claim("remote", "elsewhere:1:y")
+    # a live owner on this host keeps its job however old the lease; a remote
+    # owner is only trusted while it renews
+    assert store.requeue_abandoned(lease=0) == 1
+    assert store.queued() == ["remote"] and store.get("local")["state"] == "running"
+    assert store.renew("local", me) and not store.renew("local", "elsewhere:1:y")
+    assert not store.claim("local", "elsewhere:2:z")
+
+
+def test_artifacts_render_in_background():
+    import time
+
+    plan = client.post("/plan", json={}).json()["plan_json"]
+    plan["question"] = "artifacts"
+    plan["cohorts"] = {
+        "baseline": {"and": [{"col": "age", "op": ">=", "val": 60}]},
+        "proposed": {"and": []},
+    }
+    run_id = client.post("/run", json={"plan_json": plan}).json()["run_id"]
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        status = client.get(f"/runs/{run_id}/artifacts").json()
+        if status["state"] != "pending":
+            break
+        time.sleep(0.05)
+    assert status["state"] == "done"
+    assert "markdown" in status["timings"]
+    assert client.get("/runs/missing/artifacts").status_code == 404
+
+
+def test_metrics_and_manifest_stages():
+    plan = client.post("/plan", json={}).json()["plan_json"]
+    plan["question"] = "metrics"
+    resp = client.post("/run", json={"plan_json": plan}).json()
+    manifest = json.loads(open(resp["manifest"]).read())
+    assert manifest["start_time"] > 0 and manifest["end_time"] >= manifest["start_time"]
+    assert {"execute", "filter", "stats", "fingerprint"} <= set(manifest["stages"])
+    text = client.get("/metrics").text
+    assert 'agentic_stage_seconds_count{stage="execute"}' in text
+    assert 'agentic_cache_hit_ratio{cache="dataset"}' in text
+    assert "agentic_queue_depth " in text
+
+
+def test_readyz_reflects_prewarm():
+    import copy
+
+    from app import main
+    from app.datasets import CACHE, dataset_files, dataset_key, load_plan_frame
+    from app.planner import DEFAULT_PLAN
+    from app.validator import load_datadict, load_plan, resolve_input
+
+    assert client.get("/readyz").json() == {"status": "ready"}
+    CACHE.clear()
+    main.WARM.clear()
+    try:
+        resp = client.get("/readyz")
+        assert resp.status_code == 503 and resp.json()["status"] == "warming"
+        main._prewarm_then_ready()
+    finally:
+        main.WARM.set()
+    assert client.get("/readyz").status_code == 200
+    assert main._template.cache_info().currsize >= 1
+    dct = load_datadict(resolve_input(DEFAULT_PLAN["dataset"]["dict"]))
+    assert CACHE.holds(dataset_key(dataset_files(dct), dct))
+    hits = CACHE.hits
+    load_plan_frame(load_plan(copy.deepcopy(DEFAULT_PLAN)), dct)
+    assert CACHE.hits == hits + 1
+
+
+def test_render_memo_is_bounded(tmp_path, monkeypatch):
+    from app import reporter
+
+    def fake(plan_yaml, results, run_dir):
+        (run_dir / "evidence_card.md").write_text(plan_yaml)
+        return {
+            "card_md": str(run_dir / "evidence_card.md"),
+            "card_pdf": "",
+            "timings": {},
+        }
+
+    monkeypatch.setattr(reporter, "render_card", fake)
+    pool = reporter.RenderPool(1, memo_entries=2)
+    for i in range(4):
+        run_dir = tmp_path / str(i)
+        run_dir.mkdir()
+        pool.submit(f"plan {i}", {}, run_dir)
+    pool._pool.shutdown(wait=True)
+    assert len(pool._rendered) == 2 and pool.stats["rendered"] == 4
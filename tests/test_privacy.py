@@ -8,3 +8,60 @@ def test_small_cell():
     out = small_cell(df, 10)
     assert pd.isna(out.loc[0, "n"])
     assert out.loc[1, "n"] == 20
+
+
+def test_subgroup_tables_suppress_and_cross():
+    import numpy as np
+
+    from app.fairness import subgroup_tables
+
+    df = pd.DataFrame(
+        {"sex": ["F", "M", "M", "F", None], "band": ["a", "a", "b", "b", "a"]}
+    )
+    masks = np.array(
+        [[True, True, False, False, False], [True, True, True, True, True]]
+    )
+    out = subgroup_tables(df, masks, ["sex"], 2, {"sex": ["M", "F", "X"]}, ["sex*band"])
+    assert [r["sex"] for r in out["sex"]] == ["M", "F"]
+    assert out["sex"][0] == {
+        "sex": "M",
+        "baseline": 1,
+        "proposed": 2,
+        "delta": 1,
+        "pct": 40.0,
+    }
+    assert all(r["pct"] is None for r in out["sex*band"])
+    assert sum(r["proposed"] for r in out["sex*band"]) == 4
+
+
+def test_subgroup_cells_only_count_occurring_combinations():
+    import numpy as np
+
+    from app.fairness import subgroup_tables
+
+    # 10^15 possible cells; only the 200k rows' combinations may be allocated
+    ids = np.arange(200_000)
+    df = pd.DataFrame({"a": ids % 100_000, "b": ids // 2, "c": ids})
+    masks = np.stack([ids % 2 == 0, np.ones(len(ids), dtype=bool)])
+    out = subgroup_tables(df, masks, [], 1, {}, ["a*b*c"])
+    assert len(out["a*b*c"]) == len(ids)
+    assert out["a*b*c"][:2] == [
+        {
+            "a": 0,
+            "b": 0,
+            "c": 0,
+            "baseline": 1,
+            "proposed": 1,
+            "delta": 0,
+            "pct": 0.0005,
+        },
+        {
+            "a": 0,
+            "b": 50_000,
+            "c": 100_000,
+            "baseline": 1,
+            "proposed": 1,
+            "delta": 0,
+            "pct": 0.0005,
+        },
+    ]
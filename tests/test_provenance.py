@@ -0,0 +1,107 @@
+import time
+
+from app.provenance import RunCache
+
+
+def test_run_cache_first_writer_wins(tmp_path):
+    cache = RunCache(tmp_path / "cache.sqlite")
+    assert cache.get("k") is None
+    assert cache.put("k", "run-a") == "run-a"
+    other = RunCache(tmp_path / "cache.sqlite")
+    assert other.put("k", "run-b") == "run-a"
+    assert other.get("k") == "run-a"
+
+
+def test_run_cache_ttl_and_size(tmp_path):
+    cache = RunCache(tmp_path / "cache.sqlite", ttl=0.05, max_entries=2)
+    cache.put("old", "r0")
+    time.sleep(0.06)
+    assert cache.get("old") is None
+    assert cache.put("old", "r1") == "r1"
+    for i in range(3):
+        cache.put(f"k{i}", f"run{i}")
+    cache.evict()
+    assert cache._conn().execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 2
+
+
+def test_fingerprint_memo_and_merkle(tmp_path):
+    import hashlib
+    import json
+
+    from app import provenance
+
+    path = tmp_path / "data.parquet"
+    path.write_bytes(b"x" * 1000)
+    assert provenance.fingerprint_file(path) == hashlib.sha256(b"x" * 1000).hexdigest()
+    sidecar = json.loads((tmp_path / "data.parquet.fingerprint.json").read_text())
+    assert sidecar["ident"][2] == 1000
+    leaves = b"".join(
+        hashlib.sha256(b"\x00" + b"x" * n).digest() for n in (400, 400, 200)
+    )
+    assert (
+        provenance._merkle_sha256(path, 400)
+        == hashlib.sha256(b"\x01" + leaves).hexdigest()
+    )
+    assert sidecar["scheme"] == provenance.FINGERPRINT_SCHEME
+
+
+def test_manifest_references_environment(tmp_path):
+    import json
+
+    from app.provenance import (
+        Provenance,
+        create_manifest,
+        environment_snapshot,
+        sha256_text,
+    )
+
+    manifest = json.loads(
+        create_manifest(tmp_path, Provenance("p", "d", 0, 0.0, 1.0)).read_text()
+    )
+    digest, path = environment_snapshot()
+    assert manifest["environment_hash"] == digest == sha256_text(path.read_text())
+    assert "pip_freeze" not in manifest
+    assert manifest["dataset_hash_scheme"]["block_bytes"] > 0
+
+
+def test_spans_record_into_trace_and_noop_when_disabled(monkeypatch):
+    from app import tracing
+
+    with tracing.trace() as stages:
+        with tracing.span("unit"):
+            pass
+    assert "unit" in stages
+    assert 'stage="unit"' in tracing.METRICS.render()
+    monkeypatch.setattr(tracing, "TRACING", False)
+    with tracing.trace() as stages:
+        with tracing.span("off"):
+            pass
+    assert stages == {} and tracing.span("a") is tracing.span("b")
+
+
+def test_dataset_fingerprint_survives_a_move(tmp_path):
+    import shutil
+
+    from app.executor import dataset_fingerprint
+    from app.schemas import DataDict
+
+    src = tmp_path / "a" / "ds"
+    for part in ("site=x", "site=y"):
+        (src / part).mkdir(parents=True)
+        (src / part / "part-0.parquet").write_bytes(part.encode())
+    dst = tmp_path / "b" / "copy"
+    shutil.copytree(src, dst)
+    fingerprints = [
+        dataset_fingerprint(
+            DataDict(dataset_id="t", files=[{"path": str(root)}], columns={})
+        )
+        for root in (src, dst)
+    ]
+    assert fingerprints[0] == fingerprints[1]
+    (dst / "site=y" / "part-0.parquet").rename(dst / "site=y" / "part-1.parquet")
+    assert (
+        dataset_fingerprint(
+            DataDict(dataset_id="t", files=[{"path": str(dst)}], columns={})
+        )
+        != fingerprints[0]
+    )
@@ -10,3 +10,262 @@ def test_mean_ci_power():
     assert round(res["delta"], 1) == 1.0
     pwr = power_normal(1.0, res["sp"], 50, 0.05)
     assert 0 < pwr < 1
+
+
+def test_closed_form_n_reaches_target():
+    from app.power import n_required, power, power_curves
+
+    for kind, params in (
+        ("continuous", {"effect": 0.3, "sp": 1.2}),
+        ("binary", {"p1": 0.2, "p2": 0.3}),
+        ("time_to_event", {"hr": 0.7, "event_rate": 0.4}),
+    ):
+        n = n_required(kind, params, 0.05, 0.8)
+        assert power(kind, params, n, 0.05) >= 0.8 > power(kind, params, n - 1, 0.05)
+    grid = power_curves(
+        "continuous",
+        {"effect": 0.3, "sp": 1.2},
+        [50, 100, 200],
+        [0.01, 0.05],
+        [0.2, 0.3],
+    )
+    assert grid.shape == (2, 2, 3)
+    assert (np.diff(grid, axis=2) > 0).all()
+
+
+def test_resampling_reproducible_across_workers():
+    from app.resampling import resample_diff
+
+    rng = np.random.default_rng(0)
+    a, b = rng.normal(0, 1, 80), rng.normal(0.8, 1, 90)
+    one = resample_diff(a, b, seed=7, resamples=300, chunk=64)
+    assert one == resample_diff(a, b, seed=7, resamples=300, chunk=64, workers=2)
+    assert one["bootstrap_ci"][0] < 0.8 < one["bootstrap_ci"][1]
+    assert one["permutation_p"] < 0.01
+    assert one != resample_diff(a, b, seed=8, resamples=300, chunk=64)
+
+
+def test_resampling_chunks_fit_the_byte_budget_and_share_a_pool():
+    from app.resampling import budget_chunk, worker_pool
+
+    assert budget_chunk(250, 1_000_000, 64 << 20) == 4
+    assert budget_chunk(250, 1000, 64 << 20) == 250
+    assert budget_chunk(250, 10**9, 64 << 20) == 1
+    assert worker_pool(2) is worker_pool(2)
+
+
+def test_multi_cohort_contrasts_match_pairwise_runs():
+    import copy
+
+    import pandas as pd
+
+    from app.executor import analyze, holm
+    from app.planner import DEFAULT_PLAN
+    from app.schemas import DataDict
+    from app.validator import load_plan
+
+    rng = np.random.default_rng(3)
+    n = 2000
+    df = pd.DataFrame({"score": rng.normal(25, 5, n), "y": rng.normal(0, 1, n)})
+    df["y"] += (df["score"] > 30) * 0.4
+    dct = DataDict(dataset_id="t", files=[], columns={})
+    cohorts = {
+        "baseline": {"col": "score", "op": ">=", "val": 26},
+        "proposed": {"col": "score", "op": ">=", "val": 24},
+        **{f"t{t}": {"col": "score", "op": ">=", "val": t} for t in (28, 30, 32)},
+    }
+    raw = {
+        **copy.deepcopy(DEFAULT_PLAN),
+        "cohorts": cohorts,
+        "endpoint": {"type": "continuous", "value": "y"},
+    }
+    raw["policy"] = {"autotune": {"enable": False, "steps": []}}
+    raw["fairness"] = {}
+    results, _ = analyze(load_plan(copy.deepcopy(raw)), dct, df)
+    contrasts = results["comparisons"]["contrasts"]
+    assert [(c["reference"], c["cohort"]) for c in contrasts] == [
+        ("baseline", name) for name in list(cohorts)[1:]
+    ]
+    for c in contrasts:
+        pair = {
+            **raw,
+            "cohorts": {
+                "baseline": cohorts["baseline"],
+                "proposed": cohorts[c["cohort"]],
+            },
+        }
+        alone, _ = analyze(load_plan(copy.deepcopy(pair)), dct, df)
+        assert np.isclose(c["stats"]["delta"], alone["stats"]["delta"])
+        assert np.isclose(c["power"], alone["power"])
+    assert results["stats"]["delta"] == contrasts[0]["stats"]["delta"]
+    p = [c["p_value"] for c in contrasts]
+    assert [c["p_holm"] for c in contrasts] == list(holm(p))
+    assert all(
+        c["p_holm"] >= c["p_value"] and c["power_adjusted"] <= c["power"]
+        for c in contrasts
+    )
+    assert np.allclose(
+        holm([0.01, 0.04, 0.03, np.nan]), [0.03, 0.06, 0.06, np.nan], equal_nan=True
+    )
+
+    raw["analysis"]["comparisons"] = "pairwise"
+    pairwise, _ = analyze(load_plan(copy.deepcopy(raw)), dct, df)
+    assert len(pairwise["comparisons"]["contrasts"]) == 10
+
+    # the default policy autotunes n; the contrasts keep the plan's own n and alpha
+    raw["analysis"]["comparisons"] = "baseline"
+    raw["policy"] = copy.deepcopy(DEFAULT_PLAN["policy"])
+    tuned, notes = analyze(load_plan(copy.deepcopy(raw)), dct, df)
+    assert any(note.startswith("autotune applied: n_per_arm") for note in notes)
+    assert tuned["comparisons"] == results["comparisons"]
+
+
+def test_simulated_power_matches_analytic_and_is_reproducible():
+    from app.power import power
+    from app.simulation import simulated_power
+
+    for kind, params in (
+        ("continuous", {"effect": 0.3, "sp": 1.0}),
+        ("binary", {"p1": 0.2, "p2": 0.32}),
+        ("time_to_event", {"hr": 0.7, "event_rate": 0.6}),
+    ):
+        sim = simulated_power(kind, params, 150, 0.05, seed=4, se_target=0.01)
+        assert sim["model"] == "parametric" and sim["trials"] < 20_000
+        assert (
+            abs(sim["power"] - power(kind, params, 150, 0.05)) < 4 * sim["mc_se"] + 0.01
+        )
+
+    rng = np.random.default_rng(1)
+    sample = (rng.normal(0, 1, 400), rng.normal(0.5, 1, 500))
+    one = simulated_power(
+        "continuous",
+        {"effect": 0.3, "sp": 1.0},
+        120,
+        0.05,
+        seed=9,
+        sample=sample,
+        chunk=250,
+    )
+    assert one["model"] == "observed"
+    assert one == simulated_power(
+        "continuous",
+        {"effect": 0.3, "sp": 1.0},
+        120,
+        0.05,
+        seed=9,
+        sample=sample,
+        chunk=250,
+        workers=2,
+    )
+    assert one != simulated_power(
+        "continuous",
+        {"effect": 0.3, "sp": 1.0},
+        120,
+        0.05,
+        seed=10,
+        sample=sample,
+        chunk=250,
+    )
+
+
+def test_autotune_steps_are_bounded():
+    import copy
+
+    from app.executor import autotune
+    from app.planner import DEFAULT_PLAN
+    from app.power import power
+    from app.validator import load_plan
+
+    raw = copy.deepcopy(DEFAULT_PLAN)
+    raw["analysis"]["power"].update({"alpha": 0.05, "n_per_arm": 10, "target": 0.99})
+    raw["policy"] = {
+        "autotune": {
+            "enable": True,
+            "steps": [
+                {
+                    "param": "analysis.power.alpha",
+                    "op": "multiply",
+                    "factor": 4,
+                    "max_times": 5,
+                },
+                {
+                    "param": "analysis.power.n_per_arm",
+                    "op": "multiply",
+                    "factor": 1.01,
+                    "max_times": 2,
+                },
+                {"param": "analysis.power.n_per_arm", "op": "add", "factor": -3},
+            ],
+        }
+    }
+    plan = load_plan(raw)
+    params = {"effect": 0.1, "sp": 1.0}
+    notes = []
+    autotune(plan, "continuous", params, power("continuous", params, 10, 0.05), notes)
+    assert plan.analysis.power.alpha == 0.2
+    assert plan.analysis.power.n_per_arm == 13
+    assert sum(note.startswith("autotune clamped") for note in notes) == 2
+
+
+def test_simulated_logrank_pools_tied_times():
+    from app.simulation import _arms, _logrank_rejections, simulated_power
+    from app.survival import event_tables, logrank
+
+    rng = np.random.default_rng(0)
+    time = rng.integers(1, 6, (20, 120)).astype(float)
+    event = rng.binomial(1, 0.7, (20, 120)).astype(float)
+    arm = _arms(60, 20)
+    p = np.array(
+        [
+            logrank(
+                event_tables(time[i], event[i], np.stack([arm[i] == 0, arm[i] == 1]))
+            )["logrank_p"]
+            for i in range(20)
+        ]
+    )
+    for alpha in (0.2, 0.5, 0.8):
+        assert _logrank_rejections(time, event, arm, alpha) == np.count_nonzero(
+            p < alpha
+        )
+
+    # a null with integer times: row-order ties rejected about 18% of the time
+    sample = np.stack(
+        [rng.integers(1, 5, 500).astype(float), rng.binomial(1, 0.7, 500).astype(float)]
+    )
+    sim = simulated_power(
+        "time_to_event",
+        {"hr": 1.0, "event_rate": 0.7},
+        100,
+        0.05,
+        seed=1,
+        sample=(sample, sample),
+        se_target=0.004,
+    )
+    assert abs(sim["power"] - 0.05) < 4 * sim["mc_se"]
+
+
+def test_simulation_rows_are_capped(monkeypatch):
+    import copy
+
+    from app import simulation
+    from app.executor import power_results
+    from app.planner import DEFAULT_PLAN
+    from app.validator import load_plan
+
+    monkeypatch.setattr(simulation, "SIM_MAX_ROWS", 400_000)
+    params = {"hr": 0.8, "event_rate": 0.6}
+    sim = simulation.simulated_power("time_to_event", params, 1000, 0.05, seed=2)
+    assert sim["capped"] and sim["trials"] == 200
+    assert not simulation.simulated_power(
+        "continuous", {"effect": 0.1, "sp": 1.0}, 1000, 0.05, seed=2
+    )["capped"]
+
+    raw = copy.deepcopy(DEFAULT_PLAN)
+    raw["endpoint"] = {"type": "time_to_event", "value": {"time": "t", "event": "e"}}
+    raw["analysis"]["power"].update(
+        {"method": "simulation", "simulate_from": "parametric", "n_per_arm": 1000}
+    )
+    notes = []
+    out = power_results(load_plan(raw), "time_to_event", params, notes)
+    assert out["power_simulation"]["trials"] == 200
+    assert any(note.startswith("simulation trials capped") for note in notes)
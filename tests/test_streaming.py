@@ -0,0 +1,247 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.executor import analyze
+from app.planner import DEFAULT_PLAN
+from app.schemas import DataDict
+from app.streaming import Moments, analyze_streaming
+from app.validator import load_plan
+
+
+def _close(a, b):
+    if isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for key in a:
+            _close(a[key], b[key])
+    elif isinstance(a, list):
+        assert len(a) == len(b)
+        for x, y in zip(a, b):
+            _close(x, y)
+    elif isinstance(a, float) or isinstance(b, float):
+        assert np.isclose(a, b, equal_nan=True)
+    else:
+        assert a == b
+
+
+def test_moments_merge_matches_numpy():
+    rng = np.random.default_rng(2)
+    values = rng.normal(1e6, 3, 1000)
+    values[::7] = np.nan
+    acc = Moments()
+    for part in np.array_split(values, 9):
+        acc.update(part)
+    valid = values[~np.isnan(values)]
+    assert (acc.rows, acc.count) == (1000, len(valid))
+    assert np.isclose(acc.mean, valid.mean())
+    assert np.isclose(acc.sd, valid.std(ddof=1))
+
+
+def test_streaming_event_tables_are_bounded_and_order_free(monkeypatch):
+    import app.streaming as streaming
+    from app.streaming import StreamState
+    from app.survival import event_tables, logrank
+
+    monkeypatch.setattr(streaming, "STREAM_EVENT_TIMES", 64)
+    rng = np.random.default_rng(8)
+    time = rng.exponential(10, 4000)
+    event = rng.binomial(1, 0.7, 4000).astype(float)
+    masks = np.stack([np.arange(4000) % 2 == 0, np.arange(4000) % 2 == 1])
+    states = []
+    for splits in (5, 13):
+        parts = []
+        for idx in np.array_split(rng.permutation(4000), splits):
+            part = StreamState()
+            part.add_tables(event_tables(time[idx], event[idx], masks[:, idx]))
+            parts.append(part)
+        state = StreamState()
+        for part in parts:
+            state.merge(part)
+        states.append(state)
+    one, other = states
+    assert one.time_bin == other.time_bin > 0 and len(one.tables["times"]) <= 64
+    for key in ("times", "deaths", "observed"):
+        assert np.array_equal(one.tables[key], other.tables[key])
+    exact = logrank(event_tables(time, event, masks))
+    assert abs(logrank(one.tables)["hr"] - exact["hr"]) < 0.05
+    assert StreamState.from_json(one.to_json()).time_bin == one.time_bin
+
+
+def test_streaming_matches_in_memory(tmp_path):
+    rng = np.random.default_rng(5)
+    n = 3000
+    df = pd.DataFrame(
+        {
+            "age": rng.integers(40, 90, n),
+            "sex": rng.choice(["F", "M", "X"], n),
+            "site": rng.choice(["a", "b", None], n),
+            "y": rng.normal(0, 1, n),
+            "flag": rng.binomial(1, 0.3, n).astype(float),
+            "time": rng.exponential(10, n).round(1),
+        }
+    )
+    df.loc[::11, "y"] = np.nan
+    path = tmp_path / "data.parquet"
+    pq.write_table(
+        pa.Table.from_pandas(df, preserve_index=False), path, row_group_size=700
+    )
+    dct = DataDict(
+        dataset_id="t",
+        files=[{"path": str(path)}],
+        columns={"sex": {"role": "subgroup_field", "categories": ["M", "F"]}},
+    )
+    cohorts = {
+        "baseline": {"col": "age", "op": ">=", "val": 60},
+        "proposed": {
+            "or": [
+                {"col": "age", "op": ">=", "val": 55},
+                {"col": "site", "op": "==", "val": "b"},
+            ]
+        },
+        "young": {"col": "age", "op": "<", "val": 50},
+        "site_a": {"col": "site", "op": "==", "val": "a"},
+    }
+    fairness = {"subgroups": ["sex", "site"], "intersections": ["sex*site"]}
+    endpoints = [
+        {"type": "continuous", "value": "y"},
+        {"type": "binary", "value": "flag"},
+        {"type": "time_to_event", "value": {"time": "time", "event": "flag"}},
+    ]
+    for endpoint in endpoints:
+        raw = {
+            **copy.deepcopy(DEFAULT_PLAN),
+            "cohorts": cohorts,
+            "endpoint": endpoint,
+            "fairness": fairness,
+        }
+        raw["analysis"]["comparisons"] = "pairwise"
+        expected, _ = analyze(load_plan(copy.deepcopy(raw)), dct, df)
+        got, notes = analyze_streaming(
+            load_plan(copy.deepcopy(raw)), dct, batch_rows=512
+        )
+        _close(got, expected)
+        assert notes[0].startswith("streaming execution")
+
+
+def test_incremental_scans_only_appended_row_groups(tmp_path, monkeypatch):
+    from app import incremental
+
+    monkeypatch.setattr(incremental, "STATE_DIR", tmp_path / "state")
+    rng = np.random.default_rng(8)
+
+    def frame(n):
+        return pd.DataFrame(
+            {
+                "age": rng.integers(40, 90, n),
+                "sex": rng.choice(["F", "M"], n),
+                "y": rng.normal(0, 1, n),
+            }
+        )
+
+    data = tmp_path / "data"
+    data.mkdir()
+    first = frame(1000)
+    pq.write_table(
+        pa.Table.from_pandas(first, preserve_index=False),
+        data / "a.parquet",
+        row_group_size=250,
+    )
+    dct = DataDict(dataset_id="t", files=[{"path": str(data)}], columns={})
+    raw = {
+        **copy.deepcopy(DEFAULT_PLAN),
+        "cohorts": {
+            "baseline": {"col": "age", "op": ">=", "val": 60},
+            "proposed": {"col": "age", "op": ">=", "val": 50},
+        },
+        "endpoint": {"type": "continuous", "value": "y"},
+        "fairness": {"subgroups": ["sex"]},
+    }
+    res, _ = incremental.analyze_incremental(load_plan(copy.deepcopy(raw)), dct)
+    assert (res["incremental"]["scanned"], res["incremental"]["parent_version"]) == (
+        4,
+        None,
+    )
+    version = res["incremental"]["dataset_version"]
+
+    grown = pd.concat([first, frame(500)], ignore_index=True)
+    pq.write_table(
+        pa.Table.from_pandas(grown, preserve_index=False),
+        data / "a.parquet",
+        row_group_size=250,
+    )
+    pq.write_table(
+        pa.Table.from_pandas(frame(300), preserve_index=False),
+        data / "b.parquet",
+        row_group_size=250,
+    )
+    res, notes = incremental.analyze_incremental(load_plan(copy.deepcopy(raw)), dct)
+    assert res["incremental"]["row_groups"] == 8 and res["incremental"]["scanned"] == 4
+    assert res["incremental"]["parent_version"] == version
+    full = pd.concat([grown, pd.read_parquet(data / "b.parquet")], ignore_index=True)
+    expected, _ = analyze(load_plan(copy.deepcopy(raw)), dct, full)
+    _close({k: v for k, v in res.items() if k != "incremental"}, expected)
+
+
+def test_incremental_states_are_kept_per_dataset(tmp_path, monkeypatch):
+    from app import incremental
+
+    monkeypatch.setattr(incremental, "STATE_DIR", tmp_path / "state")
+    rng = np.random.default_rng(9)
+    raw = {
+        **copy.deepcopy(DEFAULT_PLAN),
+        "cohorts": {
+            "baseline": {"col": "age", "op": ">=", "val": 60},
+            "proposed": {"col": "age", "op": ">=", "val": 50},
+        },
+        "endpoint": {"type": "continuous", "value": "y"},
+        "fairness": {},
+    }
+    dicts = []
+    for name in ("one", "two"):
+        (tmp_path / name).mkdir()
+        df = pd.DataFrame(
+            {"age": rng.integers(40, 90, 600), "y": rng.normal(0, 1, 600)}
+        )
+        pq.write_table(
+            pa.Table.from_pandas(df, preserve_index=False),
+            tmp_path / name / "a.parquet",
+            row_group_size=200,
+        )
+        dicts.append(
+            DataDict(dataset_id="t", files=[{"path": str(tmp_path / name)}], columns={})
+        )
+    first = [
+        incremental.analyze_incremental(load_plan(copy.deepcopy(raw)), dct)[0]
+        for dct in dicts
+    ]
+    assert first[0]["incremental"]["state_key"] != first[1]["incremental"]["state_key"]
+    again, _ = incremental.analyze_incremental(load_plan(copy.deepcopy(raw)), dicts[0])
+    assert (
+        again["incremental"]["scanned"] == 0
+        and again["incremental"]["parent_version"] is None
+    )
+
+    store = tmp_path / "state" / again["incremental"]["state_key"]
+    victim = next(path for path in store.glob("*.json") if path.name != "index.json")
+    victim.unlink()  # as if a concurrent run had collected it
+    rebuilt, _ = incremental.analyze_incremental(
+        load_plan(copy.deepcopy(raw)), dicts[0]
+    )
+    assert rebuilt["incremental"]["scanned"] == 1 and victim.exists()
+    _close(
+        {k: v for k, v in rebuilt.items() if k != "incremental"},
+        {k: v for k, v in first[0].items() if k != "incremental"},
+    )
+
+    (store / "stale.json").write_text("{}")
+    incremental.collect_states(
+        store,
+        {"index.json"}
+        | {p.name for p in store.glob("*.json") if p.name != "stale.json"},
+    )
+    assert (store / "stale.json").exists()
+    incremental.collect_states(store, {"index.json"}, ttl=-1)
+    assert [p.name for p in store.glob("*.json")] == ["index.json"]
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from app.survival import event_tables, km_from_tables, km_summary
+
+lifelines = pytest.importorskip("lifelines")
+
+
+def test_km_and_logrank_match_lifelines():
+    from lifelines import KaplanMeierFitter
+    from lifelines.statistics import logrank_test
+    from lifelines.utils import median_survival_times
+
+    rng = np.random.default_rng(3)
+    ta, ea = rng.exponential(10, 200).round(1), rng.binomial(1, 0.7, 200)
+    tb, eb = rng.exponential(14, 150).round(1), rng.binomial(1, 0.6, 150)
+    res = km_summary(ta, ea, tb, eb)
+    for t, e, arm in ((ta, ea, "baseline"), (tb, eb, "proposed")):
+        km = KaplanMeierFitter().fit(t, e)
+        assert res[f"median_{arm}"] == km.median_survival_time_
+        assert np.allclose(
+            res[f"median_ci_{arm}"],
+            median_survival_times(km.confidence_interval_).values.ravel(),
+        )
+    ref = logrank_test(ta, tb, ea, eb)
+    assert np.isclose(res["logrank_chi2"], ref.test_statistic)
+    assert np.isclose(res["logrank_p"], ref.p_value)
+    assert res["hr"] < 1
+
+
+def test_batched_curves_match_single_cohorts():
+    from lifelines import KaplanMeierFitter
+
+    rng = np.random.default_rng(4)
+    time, event = rng.exponential(5, 300).round(2), rng.binomial(1, 0.5, 300)
+    masks = np.stack([rng.random(300) < p for p in (0.3, 0.5, 0.8)])
+    km = km_from_tables(event_tables(time, event, masks))
+    for k, mask in enumerate(masks):
+        ref = (
+            KaplanMeierFitter()
+            .fit(time[mask], event[mask])
+            .survival_function_.iloc[:, 0]
+        )
+        idx = np.searchsorted(km["times"], ref.index[1:].to_numpy())
+        assert np.allclose(km["survival"][k, idx], ref.to_numpy()[1:])
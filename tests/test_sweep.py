@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from app.executor import bin_stats, cont_stats
+from app.planner import DEFAULT_PLAN
+from app.schemas import DataDict, SweepSpec
+from app.sweep import sweep
+from app.validator import load_plan
+
+
+def test_sweep_matches_per_threshold_stats(tmp_path):
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame(
+        {
+            "age": rng.integers(40, 90, 400),
+            "score": rng.normal(25, 5, 400),
+            "y": rng.normal(0, 1, 400),
+            "flag": rng.binomial(1, 0.3, 400),
+        }
+    )
+    path = tmp_path / "data.parquet"
+    df.to_parquet(path)
+    dct = DataDict(dataset_id="t", files=[{"path": str(path)}], columns={})
+    cohorts = {
+        "baseline": {
+            "and": [
+                {"col": "age", "op": ">=", "val": 50},
+                {"col": "score", "op": ">=", "val": 26},
+            ]
+        },
+        "proposed": {
+            "and": [
+                {"col": "age", "op": ">=", "val": 50},
+                {"col": "score", "op": ">=", "val": 24},
+            ]
+        },
+    }
+    base = df[(df.age >= 50) & (df.score >= 26)]
+    for endpoint, stats_fn, key in (
+        ("y", cont_stats, "mean_proposed"),
+        ("flag", bin_stats, "p2"),
+    ):
+        etype = "continuous" if endpoint == "y" else "binary"
+        plan = load_plan(
+            {
+                **DEFAULT_PLAN,
+                "cohorts": cohorts,
+                "endpoint": {"type": etype, "value": endpoint},
+                "fairness": {},
+            }
+        )
+        out = sweep(plan, dct, SweepSpec(col="score", op=">=", values=[20, 24, 28]))
+        for point in out["grid"]:
+            prop = df[(df.age >= 50) & (df.score >= point["value"])]
+            expected = stats_fn(base[endpoint], prop[endpoint])
+            assert point["n_proposed"] == len(prop)
+            assert np.isclose(point["stats"][key], expected[key])
+            assert np.allclose(point["stats"]["ci"], expected["ci"])
+
+
+def test_sweep_route_reports_empty_grid_points_as_null():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from scripts.make_synth_data import main as make_data
+
+    make_data()
+    body = {
+        "plan_json": {
+            **DEFAULT_PLAN,
+            "fairness": {},
+            "cohorts": {
+                "baseline": {"col": "score", "op": ">=", "val": 26},
+                "proposed": {"col": "score", "op": ">=", "val": 24},
+            },
+        },
+        "sweep": {"col": "score", "op": ">=", "values": [20, 24, 1000]},
+    }
+    resp = TestClient(app).post("/sweep", json=body)
+    assert resp.status_code == 200
+    empty = resp.json()["grid"][2]
+    assert empty["n_proposed"] == 0
+    assert (
+        empty["stats"]["mean_proposed"] is None
+        and empty["stats"]["ci"] == [None, None]
+        and empty["power"] is None
+    )
+    assert all(v is not None for v in resp.json()["grid"][0]["stats"].values())